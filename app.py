@@ -1,28 +1,41 @@
 import os
-from datetime import date, datetime
-from typing import Optional, Dict, Any
-import io
-import unicodedata
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Tuple
 
 import pandas as pd
-import sqlite3
 import streamlit as st
-from dateutil.relativedelta import relativedelta
 from streamlit_option_menu import option_menu
-import pytz
+
+# Camada de dados (sem Streamlit): pacote estagiarios/
+from estagiarios import configuracao
+from estagiarios.backup import agendar_backup_diario, backup_para_download, diretorio_backups, listar_backups
+from estagiarios.banco import ErroEscrita, EscritaEmAndamento, get_config, get_pool, set_config
+from estagiarios.calendario import EVENTOS, eventos_no_periodo, eventos_por_semana, periodo_padrao
+from estagiarios.configuracao import (
+    BACKUP_AUTOMATICO_KEY, BACKUP_KEEP, CALENDARIO_MESES, COLUNAS_EXIBICAO, DASHBOARD_PAGE_SIZE, DEFAULT_PROXIMOS_DIAS,
+    IMPORT_CHUNK_SIZE, LOG_EXPORT_FORMATOS, LOG_RETENCAO_MESES, PERF_TOP_CONSULTAS, SEARCH_PAGE_SIZE,
+)
+from estagiarios.dados import (
+    add_regra, atualizar_status_do_dia, buscar_estagiarios_por_nome, consultar_estagiarios, contar_status,
+    delete_estagiario, delete_regra, estagiario_existente, existem_estagiarios, get_estagiario_df, get_estagiarios_df, insert_estagiario,
+    list_regras, meses_por_universidade, processar_df_para_exibicao, set_proximos_dias, update_estagiario,
+)
+from estagiarios.historico import estagiarios_em, historico_estagiario
+from estagiarios.logs import baixar_logs_arquivados, exportar_logs_arquivo, list_logs_df, listar_logs_arquivados
+from estagiarios.metricas import (
+    MedicaoRerun, etapa, medicao_do_rerun, metricas_processo, metricas_prometheus, zerar_metricas,
+)
+from estagiarios.migracoes import init_db_uma_vez
+from estagiarios.planilhas import (
+    EXPORT_FORMATOS, ErroImportacao, descrever_importacao, exportar_base_completa, exportar_para_excel_bytes, importar_arquivo,
+    sem_colunas_status,
+)
+from estagiarios.status import calcular_vencimento_final
 
 # ==========================
 # Configurações e Constantes
 # ==========================
-
-# ***** CAMINHO ABSOLUTO DEFINITIVO APLICADO *****
-# O programa agora está forçado a usar este arquivo, eliminando qualquer confusão.
-DB_FILE = "H:/GUILHERME PITA/6.EstagiariosApp/estagiarios.db"
-
 LOGO_FILE = "logo.png"
-DEFAULT_PROXIMOS_DIAS = 30
-DEFAULT_DURATION_OTHERS = 6
-TIMEZONE = pytz.timezone("America/Sao_Paulo")
 
 universidades_padrao = [
     "Anhanguera - Instituição de Ensino Anhanguera",
@@ -66,11 +79,6 @@ universidades_padrao = [
     "Outra (cadastrar manualmente)"
 ]
 
-# ==========================
-# Inicialização Streamlit
-# ==========================
-st.set_page_config(page_title="Controle de Estagiários", layout="wide", page_icon="📋")
-
 # ==========================
 # Estilo (CSS) Profissional
 # ==========================
@@ -95,210 +103,23 @@ def load_custom_css():
     """, unsafe_allow_html=True)
 
 # ==========================
-# Banco de Dados (Arquitetura Robusta)
+# Páginas
 # ==========================
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def execute_write_query(query: str, params: tuple = ()):
-    try:
-        with sqlite3.connect(DB_FILE, timeout=10) as conn:
-            conn.execute("PRAGMA journal_mode=WAL;")
-            conn.execute(query, params)
-            conn.commit()
-    except Exception as e:
-        st.error(f"Erro ao escrever no banco de dados: {e}")
-        st.stop()
-
-
-def init_db():
-    execute_write_query("CREATE TABLE IF NOT EXISTS estagiarios (id INTEGER PRIMARY KEY, nome TEXT NOT NULL, universidade TEXT NOT NULL, data_admissao TEXT NOT NULL, data_ult_renovacao TEXT, obs TEXT, data_vencimento TEXT)")
-    execute_write_query("CREATE TABLE IF NOT EXISTS regras (id INTEGER PRIMARY KEY, keyword TEXT UNIQUE NOT NULL, meses INTEGER NOT NULL)")
-    execute_write_query("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
-    execute_write_query("CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, action TEXT NOT NULL, details TEXT)")
-    
-    conn = get_db_connection()
-    try:
-        config_check = conn.execute("SELECT value FROM config WHERE key='proximos_dias'").fetchone()
-        if not config_check:
-            execute_write_query("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", ('proximos_dias', str(DEFAULT_PROXIMOS_DIAS)))
-        
-        config_check = conn.execute("SELECT value FROM config WHERE key='admin_password'").fetchone()
-        if not config_check:
-            execute_write_query("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", ('admin_password', '123456'))
-    finally:
-        conn.close()
-
-def get_config(key: str, default: Optional[str] = None) -> str:
-    conn = get_db_connection()
-    try:
-        row = conn.execute("SELECT value FROM config WHERE key=?", (key,)).fetchone()
-        return row['value'] if row else (default if default is not None else "")
-    finally:
-        conn.close()
-
-def set_config(key: str, value: str):
-    execute_write_query("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", (key, value))
-
-# ==========================
-# Funções de Lógica e CRUD
-# ==========================
-def log_action(action: str, details: str = ""):
-    timestamp = datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
-    execute_write_query("INSERT INTO logs (timestamp, action, details) VALUES (?, ?, ?)", (timestamp, action, details))
-
-def list_regras() -> pd.DataFrame:
-    conn = get_db_connection()
-    try:
-        return pd.read_sql_query("SELECT id, keyword, meses FROM regras ORDER BY keyword", conn)
-    finally:
-        conn.close()
-
-def add_regra(keyword: str, meses: int):
-    execute_write_query("INSERT OR REPLACE INTO regras(keyword, meses) VALUES (?, ?)", (keyword.upper().strip(), meses))
-    log_action("REGRA ADICIONADA/EDITADA", f"Universidade: {keyword}, Meses: {meses}")
-
-def delete_regra(regra_id: int, keyword: str):
-    execute_write_query("DELETE FROM regras WHERE id=?", (int(regra_id),))
-    log_action("REGRA EXCLUÍDA", f"ID: {regra_id}, Universidade: {keyword}")
-
-def get_estagiarios_df() -> pd.DataFrame:
-    conn = get_db_connection()
-    try:
-        df = pd.read_sql_query("SELECT * FROM estagiarios", conn, index_col="id")
-    except (pd.io.sql.DatabaseError, ValueError):
-        return pd.DataFrame()
-    finally:
-        conn.close()
-
-    if df.empty: return df
-    for col in ['data_admissao', 'data_ult_renovacao', 'data_vencimento']:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
-    df = df.sort_values(by='data_vencimento', ascending=True)
-    df.reset_index(inplace=True)
-    return df
-
-def insert_estagiario(nome: str, universidade: str, data_adm: date, data_renov: Optional[date], obs: str, data_venc: Optional[date]):
-    query = "INSERT INTO estagiarios(nome, universidade, data_admissao, data_ult_renovacao, obs, data_vencimento) VALUES (?, ?, ?, ?, ?, ?)"
-    params = (
-        nome, universidade, data_adm.isoformat(), 
-        data_renov.isoformat() if data_renov else None, 
-        obs, 
-        data_venc.isoformat() if data_venc else None
-    )
-    execute_write_query(query, params)
-    log_action("NOVO ESTAGIÁRIO", f"Nome: {nome}, Universidade: {universidade}")
-
-def update_estagiario(est_id: int, nome: str, universidade: str, data_adm: date, data_renov: Optional[date], obs: str, data_venc: Optional[date]):
-    query = "UPDATE estagiarios SET nome=?, universidade=?, data_admissao=?, data_ult_renovacao=?, obs=?, data_vencimento=? WHERE id=?"
-    params = (
-        nome, universidade, data_adm.isoformat(), 
-        data_renov.isoformat() if data_renov else None, 
-        obs, 
-        data_venc.isoformat() if data_venc else None, 
-        est_id
-    )
-    execute_write_query(query, params)
-    log_action("ESTAGIÁRIO ATUALIZADO", f"ID: {est_id}, Nome: {nome}")
-
-def delete_estagiario(est_id: int, nome: str):
-    execute_write_query("DELETE FROM estagiarios WHERE id=?", (int(est_id),))
-    log_action("ESTAGIÁRIO EXCLUÍDO", f"ID: {est_id}, Nome: {nome}")
-
-def normalize_text(text: str) -> str:
-    if not isinstance(text, str): return ""
-    return "".join(c for c in unicodedata.normalize('NFD', text.lower()) if unicodedata.category(c) != 'Mn')
-
-def meses_por_universidade(universidade: str) -> int:
-    if not universidade: return DEFAULT_DURATION_OTHERS
-    df_regras = list_regras()
-    if df_regras.empty: return DEFAULT_DURATION_OTHERS
-    regras_dict = {row["keyword"]: int(row["meses"]) for _, row in df_regras.iterrows()}
-    return regras_dict.get(universidade.upper(), DEFAULT_DURATION_OTHERS)
-
-def calcular_vencimento_final(data_adm: Optional[date]) -> Optional[date]:
-    return data_adm + relativedelta(months=24) if data_adm else None
-
-def calcular_proxima_renovacao(row: pd.Series) -> str:
-    hoje = date.today()
-    data_adm = row['data_admissao'].date() if pd.notna(row['data_admissao']) else None
-    data_ult_renov = row.get('data_ult_renovacao', pd.NaT).date() if pd.notna(row.get('data_ult_renovacao')) else None
-    if not data_adm: return ""
-    termo_meses = meses_por_universidade(row['universidade'])
-    if termo_meses >= 24: return "Contrato único"
-    limite_2_anos = data_adm + relativedelta(months=24)
-    if limite_2_anos < hoje: return "Contrato Encerrado"
-    base_date = data_ult_renov if data_ult_renov else data_adm
-    proxima_data_renovacao = base_date + relativedelta(months=6)
-    if proxima_data_renovacao > limite_2_anos: return "Término do Contrato"
-    if proxima_data_renovacao < hoje: return "Renovação Pendente"
-    return proxima_data_renovacao.strftime("%d.%m.%Y")
-
-def _determinar_status(row: pd.Series, proximos_dias: int) -> str:
-    if row['proxima_renovacao'] == "Renovação Pendente": return "Vencido"
-    data_alvo = pd.to_datetime(row['proxima_renovacao'], format='%d.%m.%Y', errors='coerce')
-    if pd.isna(data_alvo): data_alvo = row['data_vencimento']
-    if pd.isna(data_alvo): return "SEM DATA"
-    delta = (data_alvo.date() - date.today()).days
-    if delta < 0: return "Vencido"
-    if delta <= proximos_dias: return "Venc.Proximo"
-    return "OK"
-
-def processar_df_para_exibicao(df: pd.DataFrame, proximos_dias: int) -> pd.DataFrame:
-    if df.empty: return df
-    df_proc = df.copy()
-    df_proc['proxima_renovacao'] = df_proc.apply(calcular_proxima_renovacao, axis=1)
-    df_proc['status'] = df_proc.apply(_determinar_status, axis=1, args=(proximos_dias,))
-    df_proc["ultimo_ano"] = df_proc["data_vencimento"].dt.year.apply(lambda y: "SIM" if pd.notna(y) and y == date.today().year else "NÃO")
-    regras_df = list_regras()
-    if not regras_df.empty:
-        regras_24m_keywords = [row['keyword'] for _, row in regras_df.iterrows() if row['meses'] >= 24]
-        if regras_24m_keywords:
-            df_proc['data_ult_renovacao_str'] = ''
-            mask = (df_proc['universidade'].str.upper().isin(regras_24m_keywords)) & (df_proc['data_ult_renovacao'].isnull())
-            df_proc.loc[mask, 'data_ult_renovacao_str'] = "Contrato único"
-            df_proc['data_ult_renovacao_str'] = df_proc.apply(lambda row: row['data_ult_renovacao_str'] if row['data_ult_renovacao_str'] else row['data_ult_renovacao'].strftime('%d.%m.%Y') if pd.notna(row['data_ult_renovacao']) else '', axis=1)
-    else:
-        df_proc['data_ult_renovacao_str'] = df_proc['data_ult_renovacao'].apply(lambda x: x.strftime('%d.%m.%Y') if pd.notna(x) else '')
-        
-    for col in ["data_admissao", "data_vencimento"]:
-        df_proc[col] = df_proc[col].dt.strftime('%d.%m.%Y').replace('NaT', '')
-    df_proc = df_proc.rename(columns={'id': 'ID', 'nome': 'Nome', 'universidade': 'Universidade', 'data_admissao': 'Data Admissão', 'data_ult_renovacao_str': 'Renovado em:', 'status': 'Status', 'ultimo_ano': 'Ultimo Ano?', 'proxima_renovacao': 'Proxima Renovação', 'data_vencimento': 'Termino de Contrato', 'obs': 'Observação'})
-    return df_proc
-
-def list_logs_df(start_date: Optional[date] = None, end_date: Optional[date] = None) -> pd.DataFrame:
-    conn = get_db_connection()
-    try:
-        query = "SELECT timestamp, action, details FROM logs ORDER BY id DESC LIMIT 50"
-        params = ()
-        if start_date and end_date:
-            query = "SELECT timestamp, action, details FROM logs WHERE date(timestamp) BETWEEN ? AND ? ORDER BY id DESC LIMIT 50"
-            params = (start_date.isoformat(), end_date.isoformat())
-        return pd.read_sql_query(query, conn, params=params)
-    finally:
-        conn.close()
-
-def exportar_logs_bytes(start_date: Optional[date] = None, end_date: Optional[date] = None) -> bytes:
-    conn = get_db_connection()
-    try:
-        query = "SELECT timestamp, action, details FROM logs ORDER BY id ASC"
-        params = ()
-        if start_date and end_date:
-            query = "SELECT timestamp, action, details FROM logs WHERE date(timestamp) BETWEEN ? AND ? ORDER BY id ASC"
-            params = (start_date.isoformat(), end_date.isoformat())
-        df = pd.read_sql_query(query, conn, params=params)
-        return df.to_string(index=False).encode('utf-8')
-    finally:
-        conn.close()
-
-def exportar_para_excel_bytes(df: pd.DataFrame) -> bytes:
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_export = df.copy()
-        df_export.to_excel(writer, index=False, sheet_name='Estagiarios')
-    return output.getvalue()
+def botao_exportar_base(rotulo: str, nome_arquivo: str, key: str):
+    formato = st.selectbox("Formato", options=list(EXPORT_FORMATOS.keys()), format_func=lambda f: EXPORT_FORMATOS[f][0], key=f"{key}_formato")
+    st.download_button(rotulo, data=lambda: exportar_base_completa(formato), file_name=f"{nome_arquivo}.{formato}", mime=EXPORT_FORMATOS[formato][1], on_click="ignore", use_container_width=True, key=key)
+
+def consultar_pagina(chave: str, tamanho_pagina: int, consulta: Callable[[int], Tuple[pd.DataFrame, int]]) -> Tuple[pd.DataFrame, int]:
+    # consulta(offset) -> (página, total). A página guardada na sessão pode ter passado do fim se o resultado encolheu
+    # desde o último rerun (registros excluídos, status do dia recalculado): volta para a última página e consulta de
+    # novo, antes que o seletor de página receba um valor acima do máximo
+    pagina = st.session_state.get(chave, 1)
+    df, total = consulta((pagina - 1) * tamanho_pagina)
+    ultima = max(1, -(-total // tamanho_pagina))
+    if pagina > ultima:
+        st.session_state[chave] = pagina = ultima
+        df, total = consulta((pagina - 1) * tamanho_pagina)
+    return df, total
 
 def show_message(message: Dict[str, Any]):
     msg_type = message.get('type', 'info')
@@ -315,36 +136,56 @@ def page_dashboard():
         help="Define o número de dias para um contrato ser considerado 'Próximo do Vencimento'."
     )
     if str(proximos_dias_input) != get_config("proximos_dias"):
-        set_config("proximos_dias", str(proximos_dias_input))
-    df_raw = get_estagiarios_df()
-    if df_raw.empty:
+        set_proximos_dias(proximos_dias_input)
+    contagem_status = contar_status()
+    if not contagem_status:
         st.info("Nenhum estagiário cadastrado ainda.")
         return
-    df_display = processar_df_para_exibicao(df_raw, proximos_dias_input)
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("👥 Total de Estagiários", len(df_display))
-    c2.metric("✅ Contratos OK", (df_display["Status"] == "OK").sum())
-    c3.metric("⚠️ Vencimentos Próximos", (df_display["Status"] == "Venc.Proximo").sum())
-    c4.metric("⛔ Contratos Vencidos", (df_display["Status"] == "Vencido").sum())
+    c1.metric("👥 Total de Estagiários", sum(contagem_status.values()))
+    c2.metric("✅ Contratos OK", contagem_status.get("OK", 0))
+    c3.metric("⚠️ Vencimentos Próximos", contagem_status.get("Venc.Proximo", 0))
+    c4.metric("⛔ Contratos Vencidos", contagem_status.get("Vencido", 0))
+    with st.expander(f"📅 Renovações e términos nos próximos {CALENDARIO_MESES} meses"):
+        linha_do_tempo()
     st.divider()
     filtros_c1, filtros_c2 = st.columns(2)
-    filtro_status = filtros_c1.multiselect("Filtrar por status", options=["OK", "Venc.Proximo", "Vencido"])
-    filtro_nome = filtros_c2.text_input("🔎 Buscar por Nome do Estagiário")
+    voltar_para_primeira_pagina = lambda: st.session_state.update(pagina_dashboard=1)
+    filtro_status = filtros_c1.multiselect("Filtrar por status", options=["OK", "Venc.Proximo", "Vencido"], on_change=voltar_para_primeira_pagina)
+    filtro_nome = filtros_c2.text_input("🔎 Buscar por Nome do Estagiário", help="Início do nome, sem diferenciar acentos e maiúsculas", on_change=voltar_para_primeira_pagina)
     if filtro_status or filtro_nome.strip():
-        df_view = df_display.copy()
-        if filtro_status: df_view = df_view[df_view["Status"].isin(filtro_status)]
-        if filtro_nome.strip(): df_view = df_view[df_view["Nome"].str.contains(filtro_nome.strip(), case=False, na=False)]
-        if df_view.empty:
+        df_pagina, total = consultar_pagina("pagina_dashboard", DASHBOARD_PAGE_SIZE, lambda offset: consultar_estagiarios(filtro_status, filtro_nome, offset=offset))
+        if total == 0:
             st.warning("Nenhum registro encontrado para os filtros selecionados.")
         else:
-            colunas_ordenadas = ['ID', 'Nome', 'Universidade', 'Data Admissão', 'Renovado em:', 'Status', 'Ultimo Ano?', 'Proxima Renovação', 'Termino de Contrato', 'Observação']
-            st.dataframe(df_view[colunas_ordenadas], use_container_width=True, hide_index=True)
-            df_export_raw = get_estagiarios_df()
-            df_export_filtered = df_export_raw[df_export_raw['id'].isin(df_view['ID'])]
-            st.download_button("📥 Exportar Resultado", exportar_para_excel_bytes(df_export_filtered), "estagiarios_filtrados.xlsx", key="download_dashboard")
+            total_paginas = -(-total // DASHBOARD_PAGE_SIZE)
+            if total_paginas > 1:
+                st.number_input(f"Página (de {total_paginas}, {total} registros)", min_value=1, max_value=total_paginas, step=1, key="pagina_dashboard")
+            df_view = processar_df_para_exibicao(df_pagina, proximos_dias_input)
+            st.dataframe(df_view[COLUNAS_EXIBICAO], use_container_width=True, hide_index=True)
+            exportar_filtrados = lambda: exportar_para_excel_bytes(sem_colunas_status(consultar_estagiarios(filtro_status, filtro_nome, limite=None)[0]))
+            st.download_button("📥 Exportar Resultado", exportar_filtrados, "estagiarios_filtrados.xlsx", on_click="ignore", key="download_dashboard")
     else:
         st.info("ℹ️ Utilize os filtros acima para pesquisar e exibir os dados dos estagiários.")
 
+def linha_do_tempo():
+    inicio, fim = periodo_padrao()
+    st.bar_chart(eventos_por_semana(inicio, fim), x_label="Semana", y_label="Eventos")
+    c1, c2 = st.columns(2)
+    voltar_para_primeira_pagina = lambda: st.session_state.update(pagina_calendario=1)
+    periodo = c1.date_input("Período", value=(inicio, inicio + timedelta(days=DEFAULT_PROXIMOS_DIAS)), min_value=inicio, max_value=fim, format="DD/MM/YYYY", key="periodo_calendario", on_change=voltar_para_primeira_pagina)
+    evento = c2.selectbox("Evento", options=["Todos"] + EVENTOS, key="evento_calendario", on_change=voltar_para_primeira_pagina)
+    if len(periodo) != 2: return
+    df_eventos, total = consultar_pagina("pagina_calendario", DASHBOARD_PAGE_SIZE, lambda offset: eventos_no_periodo(periodo[0], periodo[1], None if evento == "Todos" else evento, offset=offset))
+    if total == 0:
+        st.info("Nenhum evento no período.")
+        return
+    total_paginas = -(-total // DASHBOARD_PAGE_SIZE)
+    if total_paginas > 1:
+        st.number_input(f"Página (de {total_paginas}, {total} eventos)", min_value=1, max_value=total_paginas, step=1, key="pagina_calendario")
+    df_eventos['data'] = df_eventos['data'].dt.strftime('%d/%m/%Y')
+    st.dataframe(df_eventos.rename(columns={'data': 'Data', 'evento': 'Evento', 'id': 'ID', 'nome': 'Nome', 'universidade': 'Universidade'}), use_container_width=True, hide_index=True)
+
 def page_cadastro():
     st.header("Gerenciar Estagiários")
     if 'sub_menu_cad' not in st.session_state: st.session_state.sub_menu_cad = None
@@ -382,8 +223,13 @@ def page_cadastro():
             
             submitted = st.form_submit_button("💾 Salvar Novo Estagiário", use_container_width=True)
             if submitted:
+                id_existente = None
+                if nome and universidade and data_adm:
+                    id_existente = estagiario_existente(nome, universidade, data_adm)
                 if not nome or not universidade or not data_adm:
                     st.session_state.message = {'text': "Preencha todos os campos obrigatórios (*).", 'type': 'warning'}
+                elif id_existente is not None:
+                    st.session_state.message = {'text': f"{nome} já está cadastrado nessa universidade com essa data de admissão (ID: {id_existente}).", 'type': 'warning'}
                 else:
                     data_venc = calcular_vencimento_final(data_adm)
                     insert_estagiario(nome, universidade, data_adm, data_renov if not renov_disabled else None, obs, data_venc)
@@ -395,11 +241,9 @@ def page_cadastro():
             st.rerun()
 
     if st.session_state.sub_menu_cad == "Editar":
-        df_estagiarios = get_estagiarios_df()
-
         if 'id_para_editar' in st.session_state and st.session_state.id_para_editar:
-            # Filtra o DataFrame para obter os dados do estagiário a ser editado
-            est_data_list = df_estagiarios[df_estagiarios['id'] == st.session_state.id_para_editar]
+            # Busca só o registro do estagiário a ser editado
+            est_data_list = get_estagiario_df(st.session_state.id_para_editar)
             
             if est_data_list.empty:
                 st.warning("Estagiário não encontrado. Retornando para a busca.")
@@ -441,9 +285,14 @@ def page_cadastro():
                         universidade_nova = uni_select
 
                     data_adm_nova = st.session_state.get('data_adm_edit')
+                    id_existente = None
+                    if nome_novo and universidade_nova and data_adm_nova:
+                        id_existente = estagiario_existente(nome_novo, universidade_nova, data_adm_nova, st.session_state.id_para_editar)
 
                     if not nome_novo or not universidade_nova or not data_adm_nova:
                         st.session_state.message = {'text': "VERIFICAÇÃO FALHOU: Um campo obrigatório está vazio.", 'type': 'error'}
+                    elif id_existente is not None:
+                        st.session_state.message = {'text': f"VERIFICAÇÃO FALHOU: outro cadastro (ID: {id_existente}) já tem esse nome, universidade e data de admissão.", 'type': 'error'}
                     else:
                         data_renov_nova = st.session_state.get('data_renov_edit')
                         obs_nova = st.session_state.get('obs_edit')
@@ -471,6 +320,11 @@ def page_cadastro():
             if c_cancel.button("Voltar para a Busca", use_container_width=True):
                 st.session_state.id_para_editar = None
                 st.rerun()
+
+            with st.expander("🕰️ Histórico de alterações"):
+                df_hist = historico_estagiario(st.session_state.id_para_editar)
+                df_hist['operacao'] = df_hist['operacao'].map({'I': "Inclusão", 'U': "Alteração", 'D': "Exclusão"})
+                st.dataframe(df_hist, use_container_width=True, hide_index=True)
             
             if 'confirm_delete_id' in st.session_state and st.session_state.confirm_delete_id:
                 data_to_delete = st.session_state.confirm_delete_id
@@ -487,23 +341,23 @@ def page_cadastro():
                     st.session_state.confirm_delete_id = None
                     st.rerun()
         else:
-            if df_estagiarios.empty:
+            if not existem_estagiarios():
                 st.info("Nenhum estagiário para editar.")
                 return
-            search_term = st.text_input("🔎 Digite o nome do estagiário para buscar", placeholder="Ex: João da Silva")
+            search_term = st.text_input("🔎 Digite o nome do estagiário para buscar", placeholder="Ex: João da Silva", help="Início do nome, sem diferenciar acentos e maiúsculas", on_change=lambda: st.session_state.update(pagina_busca=1))
             if search_term.strip():
-                normalized_search = normalize_text(search_term.strip())
-                df_estagiarios['nome_normalizado'] = df_estagiarios['nome'].apply(normalize_text)
-                df_results = df_estagiarios[df_estagiarios['nome_normalizado'].str.contains(normalized_search, na=False)].copy()
-                df_results.reset_index(drop=True, inplace=True)
-                if df_results.empty:
+                df_results, total = consultar_pagina("pagina_busca", SEARCH_PAGE_SIZE, lambda offset: buscar_estagiarios_por_nome(search_term, offset=offset))
+                if total == 0:
                     st.warning("Nenhum estagiário encontrado com esse nome.")
-                elif len(df_results) == 1:
+                elif total == 1:
                     st.success(f"Estagiário encontrado: {df_results.iloc[0]['nome']}. Carregando formulário de edição...")
                     st.session_state.id_para_editar = df_results.iloc[0]['id']
                     st.rerun()
                 else:
-                    st.info(f"{len(df_results)} estagiários encontrados. Por favor, selecione um abaixo para editar.")
+                    st.info(f"{total} estagiários encontrados. Por favor, selecione um abaixo para editar.")
+                    total_paginas = -(-total // SEARCH_PAGE_SIZE)
+                    if total_paginas > 1:
+                        st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, step=1, key="pagina_busca")
                     df_results['data_admissao_str'] = df_results['data_admissao'].dt.strftime('%d/%m/%Y')
                     df_display_cols = ['id', 'nome', 'universidade', 'data_admissao_str']
                     st.dataframe(df_results[df_display_cols], use_container_width=True, hide_index=True)
@@ -522,9 +376,17 @@ def page_base():
         return
     proximos_dias_config = int(get_config("proximos_dias", DEFAULT_PROXIMOS_DIAS))
     df_display = processar_df_para_exibicao(df_raw, proximos_dias_config)
-    colunas_ordenadas = ['ID', 'Nome', 'Universidade', 'Data Admissão', 'Renovado em:', 'Status', 'Ultimo Ano?', 'Proxima Renovação', 'Termino de Contrato', 'Observação']
-    st.dataframe(df_display[colunas_ordenadas], use_container_width=True, hide_index=True)
-    st.download_button("📥 Exportar Base Completa", exportar_para_excel_bytes(get_estagiarios_df()), "base_completa_estagiarios.xlsx", key="download_base")
+    st.dataframe(df_display[COLUNAS_EXIBICAO], use_container_width=True, hide_index=True)
+    botao_exportar_base("📥 Exportar Base Completa", "base_completa_estagiarios", key="download_base")
+
+    with st.expander("🕰️ Base em uma data passada"):
+        data_consulta = st.date_input("Como estava a base em", value=None, max_value=date.today(), format="DD/MM/YYYY", key="data_base_passada")
+        if data_consulta:
+            df_passado = estagiarios_em(data_consulta)
+            if df_passado.empty:
+                st.info("Nenhum estagiário registrado no histórico nessa data.")
+            else:
+                st.dataframe(processar_df_para_exibicao(df_passado, proximos_dias_config)[COLUNAS_EXIBICAO], use_container_width=True, hide_index=True)
 
 def page_regras():
     st.header("Gerenciar Regras de Contrato")
@@ -579,41 +441,35 @@ def page_import_export():
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("📥 Exportar Todos os Dados")
-        df_export = get_estagiarios_df()
-        st.download_button(label="Baixar Planilha Completa (.xlsx)", data=exportar_para_excel_bytes(df_export), file_name="estagiarios_export_completo.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
+        botao_exportar_base("Baixar Planilha Completa", "estagiarios_export_completo", key="download_export_completo")
     with c2:
-        st.subheader("📤 Importar de Arquivo Excel")
-        st.info("Colunas obrigatórias: `nome`, `universidade`, `data_admissao`.")
+        st.subheader("📤 Importar de Arquivo Excel ou CSV")
+        st.info("Colunas obrigatórias: `nome`, `universidade`, `data_admissao`. Arquivos grandes são gravados em blocos de "
+                f"{IMPORT_CHUNK_SIZE} linhas; CSV é lido bem mais rápido que Excel.")
         with st.form("form_import"):
-            arquivo = st.file_uploader("Selecione o arquivo Excel (.xlsx)", type=["xlsx"])
+            arquivo = st.file_uploader("Selecione o arquivo (.xlsx ou .csv)", type=["xlsx", "csv"])
+            apenas_validar = st.checkbox("Apenas validar (simulação, nada é gravado)")
             submitted = st.form_submit_button("Iniciar Importação", use_container_width=True)
-            if submitted and arquivo:
-                try:
-                    df_import = pd.read_excel(arquivo)
-                    required_cols = ['nome', 'universidade', 'data_admissao']
-                    if not all(col in df_import.columns for col in required_cols):
-                        st.error(f"O arquivo precisa ter as colunas obrigatórias: {', '.join(required_cols)}")
-                    else:
-                        count = 0
-                        with st.spinner("Importando dados..."):
-                            for _, row in df_import.iterrows():
-                                try:
-                                    nome = str(row["nome"]).strip().upper()
-                                    universidade = str(row["universidade"]).strip().upper()
-                                    data_adm = pd.to_datetime(row["data_admissao"]).date()
-                                    if nome and universidade and data_adm:
-                                        data_renov = pd.to_datetime(row.get("data_ult_renovacao")).date() if pd.notna(row.get("data_ult_renovacao")) else None
-                                        obs = str(row.get("obs","")).strip().upper()
-                                        data_venc = calcular_vencimento_final(data_adm)
-                                        insert_estagiario(nome, universidade, data_adm, data_renov, obs, data_venc)
-                                        count += 1
-                                except Exception as e:
-                                    st.warning(f"Erro ao importar a linha com nome '{row.get('nome', 'N/A')}': {e}")
-                        st.success(f"{count} estagiários importados com sucesso!")
-                except Exception as e:
-                    st.error(f"Não foi possível ler o arquivo. Erro: {e}")
-            elif submitted and not arquivo:
-                st.warning("Por favor, selecione um arquivo para importar.")
+        if submitted and arquivo:
+            andamento = st.progress(0.0, text="⏳ Lendo o arquivo...")
+            progresso = lambda lidas, gravadas, fracao: andamento.progress(fracao, text=f"⏳ {lidas} linhas lidas" + ("" if apenas_validar else f", {gravadas} gravadas") + "...")
+            try:
+                validas, inseridos, atualizados, df_rejeitados = importar_arquivo(arquivo, arquivo.name, apenas_validar, progresso)
+            except ErroImportacao as e:
+                andamento.empty()
+                st.error(f"{e}. " + (f"Os {e.importados} estagiários dos blocos anteriores já foram gravados." if e.importados else "Nenhum registro foi gravado."))
+                return
+            andamento.empty()
+            if apenas_validar:
+                st.info(f"Simulação concluída: {validas} linhas válidas e {len(df_rejeitados)} rejeitadas. Nada foi gravado.")
+            elif validas:
+                st.success(f"Importação concluída: {descrever_importacao(inseridos, atualizados, validas)}.")
+            if not df_rejeitados.empty:
+                st.warning(f"{len(df_rejeitados)} linhas rejeitadas na validação.")
+                st.dataframe(df_rejeitados, use_container_width=True, hide_index=True)
+                st.download_button("📥 Baixar Linhas Rejeitadas (.xlsx)", exportar_para_excel_bytes(df_rejeitados), "linhas_rejeitadas.xlsx", on_click="ignore", use_container_width=True, key="download_rejeitados")
+        elif submitted and not arquivo:
+            st.warning("Por favor, selecione um arquivo para importar.")
 
 def page_admin():
     st.header("🔑 Área Administrativa")
@@ -633,9 +489,22 @@ def page_admin():
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Backup do Banco de Dados")
-        if os.path.exists(DB_FILE):
-            with open(DB_FILE, "rb") as f: db_bytes = f.read()
-            st.download_button(label="📥 Baixar Backup (.db)", data=db_bytes, file_name="backup_estagiarios.db", use_container_width=True)
+        if os.path.exists(configuracao.DB_FILE):
+            compactar = st.checkbox("Compactar backup (.gz)", value=True)
+            nome_backup = "backup_estagiarios.db.gz" if compactar else "backup_estagiarios.db"
+            st.download_button(label="📥 Baixar Backup", data=lambda: backup_para_download(compactar), file_name=nome_backup, mime="application/octet-stream", on_click="ignore", use_container_width=True)
+            backup_automatico = st.checkbox(f"Backup automático diário (mantém os {BACKUP_KEEP} mais recentes)", value=get_config(BACKUP_AUTOMATICO_KEY, "0") == "1")
+            if backup_automatico != (get_config(BACKUP_AUTOMATICO_KEY, "0") == "1"):
+                set_config(BACKUP_AUTOMATICO_KEY, "1" if backup_automatico else "0")
+            backups = listar_backups()
+            if backups: st.caption(f"Último backup automático: {backups[0]} ({len(backups)} em {diretorio_backups()})")
+        stats = get_pool().estatisticas()
+        st.caption(f"Conexões abertas: {stats['abertas']} (leitura: {stats['leitores']}, criadas desde o início: {stats['criadas']})")
+        st.caption(f"Escritas gravadas: {stats['escritas']} em {stats['commits']} commits")
+        st.caption(f"Config relida do banco {stats['leituras_config']} vezes (só depois de gravações, deste ou de outro processo)")
+        if configuracao.DB_PRIMARY_URL:
+            st.caption(f"Réplica local sincronizada {stats['sincronizacoes']} vezes com o primário libsql")
+            if stats['erro_sincronizacao']: st.warning(f"Falha ao sincronizar a réplica: {stats['erro_sincronizacao']}")
     with c2:
         st.subheader("Logs do Sistema")
         col_f1, col_f2 = st.columns(2)
@@ -644,19 +513,66 @@ def page_admin():
         logs_df = list_logs_df(start_date=start_date, end_date=end_date)
         if logs_df.empty: st.info("Nenhum log encontrado para o período selecionado.")
         else: st.dataframe(logs_df, use_container_width=True, hide_index=True)
-        log_bytes = exportar_logs_bytes(start_date=start_date, end_date=end_date)
-        st.download_button(label="📥 Baixar Log do Período", data=log_bytes, file_name=f"log_{start_date}_a_{end_date}.txt" if start_date and end_date else "log_periodo.txt", mime="text/plain", use_container_width=True)
+        formato = st.selectbox("Formato do arquivo", options=list(LOG_EXPORT_FORMATOS.keys()), format_func=lambda f: LOG_EXPORT_FORMATOS[f][0])
+        nome_base = f"log_{start_date}_a_{end_date}" if start_date and end_date else "log_periodo"
+        st.download_button(label="📥 Baixar Log do Período", data=lambda: exportar_logs_arquivo(start_date, end_date, formato), file_name=f"{nome_base}.{formato}", mime=LOG_EXPORT_FORMATOS[formato][1], on_click="ignore", use_container_width=True)
+        arquivados = listar_logs_arquivados()
+        if not arquivados.empty:
+            st.caption(f"Logs com mais de {LOG_RETENCAO_MESES} meses são arquivados mensalmente (NDJSON compactado).")
+            mes = st.selectbox("Mês arquivado", options=arquivados['mes'].tolist(), format_func=lambda m: f"{m} ({int(arquivados.loc[arquivados['mes'] == m, 'quantidade'].iloc[0])} registros)")
+            st.download_button(label="📥 Baixar Log Arquivado", data=lambda: baixar_logs_arquivados(mes), file_name=f"log_{mes}.ndjson.gz", mime="application/gzip", on_click="ignore", use_container_width=True)
     st.divider()
+    with st.expander("⏱️ Performance"):
+        painel_performance()
     if st.button("Sair da Área Admin", use_container_width=True):
         st.session_state.admin_logged_in = False
         st.rerun()
 
+def painel_performance():
+    ultimo = st.session_state.get("perf_ultimo_rerun")
+    stats = get_pool().estatisticas()
+    p1, p2, p3, p4 = st.columns(4)
+    p1.metric("Último rerun", f"{ultimo['segundos'] * 1000:.0f} ms" if ultimo else "-")
+    p2.metric("Consultas no rerun", ultimo['consultas'] if ultimo else "-")
+    p3.metric("Tempo no banco", f"{ultimo['segundos_consultas'] * 1000:.1f} ms" if ultimo else "-")
+    p4.metric("Conexões abertas", stats['abertas'])
+    if ultimo:
+        st.caption(f"Rerun anterior desta sessão (página: {ultimo['pagina'] or '-'})")
+        c1, c2 = st.columns(2)
+        c1.dataframe(pd.DataFrame([{"etapa/função": nome, "chamadas": v["chamadas"], "ms": round(v["segundos"] * 1000, 2)} for nome, v in ultimo["funcoes"].items()]), use_container_width=True, hide_index=True)
+        c2.dataframe(pd.DataFrame([{"ms": round(c["segundos"] * 1000, 2), "sql": c["sql"]} for c in ultimo["consultas_lentas"]]), use_container_width=True, hide_index=True)
+    df_funcoes, df_consultas, (reruns, segundos_reruns) = metricas_processo()
+    st.caption(f"Desde o início do processo: {reruns} reruns, {segundos_reruns:.1f} s no total")
+    st.dataframe(df_funcoes, use_container_width=True, hide_index=True)
+    st.dataframe(df_consultas.head(PERF_TOP_CONSULTAS), use_container_width=True, hide_index=True)
+    c1, c2 = st.columns(2)
+    c1.download_button("📥 Métricas (Prometheus)", data=metricas_prometheus, file_name="metricas_estagiarios.prom", mime="text/plain", on_click="ignore", use_container_width=True)
+    if c2.button("Zerar estatísticas", use_container_width=True): zerar_metricas()
+
 # ==========================
 # Main App
 # ==========================
 def main():
+    st.set_page_config(page_title="Controle de Estagiários", layout="wide", page_icon="📋")
+    try:
+        with medicao_do_rerun() as medicao:
+            try:
+                renderizar_app(medicao)
+            except EscritaEmAndamento as e:
+                st.warning(f"Escrita no banco de dados demorada: {e}")
+                st.stop()
+            except ErroEscrita as e:
+                st.error(f"Erro ao escrever no banco de dados: {e}")
+                st.stop()
+    finally:
+        # Reruns só de navegação (st.rerun antes de desenhar a página) não substituem o último resumo útil
+        if medicao.pagina: st.session_state["perf_ultimo_rerun"] = medicao.resumo
+
+def renderizar_app(medicao: MedicaoRerun):
     load_custom_css()
-    init_db()
+    with etapa("init_db_uma_vez"): init_db_uma_vez(configuracao.DB_FILE)
+    atualizar_status_do_dia()
+    agendar_backup_diario()
     c1, c2 = st.columns([1, 4], vertical_alignment="center")
     if os.path.exists(LOGO_FILE): c1.image(LOGO_FILE, width=150)
     with c2:
@@ -683,7 +599,9 @@ def main():
         "Regras": page_regras, "Import/Export": page_import_export, "Área Administrativa": page_admin
     }
     if selected in page_mapper:
-        page_mapper[selected]()
+        medicao.pagina = selected
+        with etapa(f"página {selected}"):
+            page_mapper[selected]()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,213 @@
+"""Benchmark da camada de dados (pacote estagiarios), sem Streamlit.
+
+Uso: python benchmark.py [--tamanhos 1000 10000 100000] [--logs 1000000] [--saida benchmark.json]
+
+Para cada tamanho cria um banco temporário com estagiários, regras e logs sintéticos,
+mede cada função quente (melhor tempo entre as repetições) e o pico de memória (tracemalloc),
+e grava tudo em JSON para comparar execuções entre commits. Com --logs, mede também só a exportação de logs
+num banco com essa quantidade de linhas (o pico de memória deve ficar estável com o volume).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+import pandas as pd
+
+from estagiarios import banco, calendario, configuracao, dados, historico, logs, migracoes, planilhas, status
+
+UNIVERSIDADES = ["UFRJ", "UERJ", "UFF", "PUC-RIO", "UNIRIO", "UCAM", "ESTACIO", "UNESA", "IBMEC", "FGV"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Érica", "Fábio", "Gabriela", "Hugo", "Íris", "João", "Letícia", "Marcos"]
+SOBRENOMES = ["Silva", "Souza", "Conceição", "Araújo", "Pereira", "Lima", "Gonçalves", "Rodrigues"]
+
+
+# ==========================
+# Dados sintéticos
+# ==========================
+def gerar_estagiarios(n: int, seed: int = 42) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    hoje = date.today()
+    linhas = []
+    for i in range(n):
+        adm = hoje - timedelta(days=rnd.randint(0, 1100))
+        renov = adm + timedelta(days=rnd.randint(30, 400)) if rnd.random() < 0.4 else None
+        linhas.append({
+            "nome": f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {i}",
+            "universidade": rnd.choice(UNIVERSIDADES + [f"FACULDADE {rnd.randint(1, 200)}"]),
+            "data_admissao": adm, "data_ult_renovacao": renov,
+            "obs": "" if rnd.random() < 0.7 else "Observação de teste",
+            "data_vencimento": adm + timedelta(days=730),
+        })
+    return pd.DataFrame(linhas)
+
+def gerar_logs(n: int, seed: int = 42) -> Iterator[tuple]:
+    rnd = random.Random(seed)
+    inicio = datetime.now() - timedelta(days=365)
+    acoes = ["NOVO ESTAGIÁRIO", "ESTAGIÁRIO ATUALIZADO", "ESTAGIÁRIO EXCLUÍDO", "REGRA ADICIONADA/EDITADA"]
+    # Gerador: com milhões de linhas a lista inteira pesaria mais que a própria exportação medida
+    return (((inicio + timedelta(seconds=i * 31536000 // max(n, 1))).strftime("%Y-%m-%d %H:%M:%S"), rnd.choice(acoes), f"ID: {i}, Nome: Teste {i}") for i in range(n))
+
+def novo_banco(caminho: str):
+    # Os caches dos módulos são zerados porque as versões recomeçam do zero
+    configuracao.DB_FILE = caminho
+    dados._indice_regras = (None, {})
+    dados._snapshot_estagiarios = (None, pd.DataFrame())
+    dados._status_calculado_em = None
+    planilhas._exportacoes_em_cache = {}
+    calendario._semanas_em_cache = (None, {})
+    migracoes.init_db()
+
+def preparar_banco(diretorio: str, n: int) -> pd.DataFrame:
+    novo_banco(os.path.join(diretorio, f"bench_{n}.db"))
+    for i, uni in enumerate(UNIVERSIDADES[:5]):
+        dados.add_regra(uni, 24 if i % 2 == 0 else 12)
+    sinteticos = gerar_estagiarios(n)
+    validos, _ = planilhas.validar_importacao(sinteticos)
+    planilhas.importar_estagiarios(validos)
+    with banco.get_pool().escrita() as conn:
+        conn.executemany(logs.LOG_INSERT_QUERY, gerar_logs(n))
+    return sinteticos
+
+
+# ==========================
+# Medição
+# ==========================
+def medir(nome: str, n: int, funcao, repeticoes: int, preparar=None) -> dict:
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar: preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    # Pico de memória numa execução separada: o tracemalloc distorce o tempo
+    if preparar: preparar()
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    resultado = {"caso": nome, "linhas": n, "segundos": round(min(tempos), 6), "media_segundos": round(sum(tempos) / len(tempos), 6), "pico_mb": round(pico / 2**20, 3)}
+    print(f"{nome:<32} {n:>8} {resultado['segundos']:>10.4f}s {resultado['pico_mb']:>10.2f} MB", flush=True)
+    return resultado
+
+def escritas_concorrentes(sessoes: int, por_sessao: int):
+    # Simula várias sessões do Streamlit gravando ao mesmo tempo pela fila de escrita
+    def sessao(k):
+        for i in range(por_sessao):
+            banco.execute_write_query("INSERT INTO config(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (f"bench_{k}_{i}", str(i)))
+    threads = [threading.Thread(target=sessao, args=(k,)) for k in range(sessoes)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+def rodar_tamanho(diretorio: str, n: int, repeticoes: int) -> list:
+    sinteticos = preparar_banco(diretorio, n)
+    proximos_dias = int(banco.get_config("proximos_dias", configuracao.DEFAULT_PROXIMOS_DIAS))
+    regras = dados.get_indice_regras()
+    df = dados.get_estagiarios_df()
+    sem_status = df.drop(columns=configuracao.COLUNAS_STATUS)
+    excel = planilhas.exportar_para_excel_bytes(df)
+    csv = planilhas.exportar_para_csv_bytes(df)
+    hoje = date.today()
+    invalidar_snapshot = lambda: setattr(dados, "_snapshot_estagiarios", (None, pd.DataFrame()))
+    invalidar_semanas = lambda: setattr(calendario, "_semanas_em_cache", (None, {}))
+    periodo = calendario.periodo_padrao(hoje)
+    with banco.get_db_connection() as conn:
+        bruto = pd.read_sql_query("SELECT id, nome, universidade, data_admissao, data_ult_renovacao, obs, data_vencimento FROM estagiarios", conn)
+    em_dobro = pd.concat([bruto, bruto.assign(id=bruto["id"] + len(bruto))], ignore_index=True)
+    casos = [
+        ("get_estagiarios_df", dados.get_estagiarios_df, invalidar_snapshot),
+        ("get_estagiarios_df (cache)", dados.get_estagiarios_df, None),
+        ("processar_df_para_exibicao", lambda: dados.processar_df_para_exibicao(df, proximos_dias), None),
+        ("processar_df (sem status)", lambda: dados.processar_df_para_exibicao(sem_status, proximos_dias), None),
+        ("meses_por_universidade", lambda: [dados.meses_por_universidade(u, regras) for u in df["universidade"]], None),
+        ("calcular_status", lambda: status.calcular_status(df, proximos_dias, regras, hoje), None),
+        ("recalcular_status (base toda)", lambda: banco.executar_escrita(status.recalcular_status), None),
+        ("consultar_estagiarios", lambda: dados.consultar_estagiarios(["Vencido", "Venc.Proximo"], ""), None),
+        ("buscar_estagiarios_por_nome", lambda: dados.buscar_estagiarios_por_nome("silva"), None),
+        ("contar_status", dados.contar_status, None),
+        ("estagiarios_em (as-of)", lambda: historico.estagiarios_em(hoje), None),
+        ("atualizar_calendario (base toda)", lambda: banco.executar_escrita(calendario.atualizar_calendario), None),
+        ("eventos_por_semana (12 meses)", lambda: calendario.eventos_por_semana(*periodo), invalidar_semanas),
+        ("eventos_no_periodo (30 dias)", lambda: calendario.eventos_no_periodo(hoje, hoje + timedelta(days=30)), None),
+        ("exportar_excel", lambda: planilhas.exportar_para_excel_bytes(df), None),
+        ("exportar_csv", lambda: planilhas.exportar_para_csv_bytes(df), None),
+        ("ler_excel + validar_importacao", lambda: planilhas.validar_importacao(pd.read_excel(io.BytesIO(excel))), None),
+        ("validar_importacao", lambda: planilhas.validar_importacao(sinteticos), None),
+        ("agrupar_duplicatas (2x a base)", lambda: dados.agrupar_duplicatas(em_dobro), None),
+        ("importar_arquivo xlsx (validar)", lambda: planilhas.importar_arquivo(io.BytesIO(excel), "bench.xlsx", apenas_validar=True), None),
+        ("importar_arquivo csv (validar)", lambda: planilhas.importar_arquivo(io.BytesIO(csv), "bench.csv", apenas_validar=True), None),
+        ("list_logs_df", lambda: logs.list_logs_df(hoje - timedelta(days=30), hoje), None),
+        ("exportar_logs txt", lambda: logs.exportar_logs_arquivo(formato="txt").close(), None),
+        ("exportar_logs csv", lambda: logs.exportar_logs_arquivo(formato="csv").close(), None),
+        ("escritas concorrentes 8x100", lambda: escritas_concorrentes(8, 100), None),
+    ]
+    resultados = [medir(nome, n, funcao, repeticoes, preparar) for nome, funcao, preparar in casos]
+    # Importações por último: reimportam a mesma base, então medem o upsert de n estagiários já cadastrados
+    validos, _ = planilhas.validar_importacao(sinteticos)
+    resultados.append(medir("importar_estagiarios", n, lambda: planilhas.importar_estagiarios(validos), 1))
+    resultados.append(medir("importar_arquivo csv (em blocos)", n, lambda: planilhas.importar_arquivo(io.BytesIO(csv), "bench.csv"), 1))
+    banco.get_pool().fechar()
+    return resultados
+
+def rodar_logs(diretorio: str, n: int, repeticoes: int) -> list:
+    # Só logs, sem estagiários: isola a exportação em streaming
+    novo_banco(os.path.join(diretorio, f"bench_logs_{n}.db"))
+    with banco.get_pool().escrita() as conn:
+        conn.executemany(logs.LOG_INSERT_QUERY, gerar_logs(n))
+    hoje = date.today()
+    casos = [
+        ("list_logs_df (só logs)", lambda: logs.list_logs_df(hoje - timedelta(days=30), hoje)),
+        ("exportar_logs txt (só logs)", lambda: logs.exportar_logs_arquivo(formato="txt").close()),
+        ("exportar_logs csv (só logs)", lambda: logs.exportar_logs_arquivo(formato="csv").close()),
+    ]
+    resultados = [medir(nome, n, funcao, repeticoes) for nome, funcao in casos]
+    banco.get_pool().fechar()
+    return resultados
+
+def commit_atual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da camada de dados do Controle de Estagiários")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--logs", type=int, nargs="+", default=[], help="quantidades de logs para medir só a exportação de logs")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", default="benchmark.json")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="bench_estagiarios_")
+    resultados = []
+    try:
+        for n in args.tamanhos:
+            resultados.extend(rodar_tamanho(diretorio, n, args.repeticoes))
+        for n in args.logs:
+            resultados.extend(rodar_logs(diretorio, n, args.repeticoes))
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+    relatorio = {
+        "commit": commit_atual(),
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(), "pandas": pd.__version__, "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "resultados": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}")
+
+if __name__ == "__main__":
+    sys.exit(main())
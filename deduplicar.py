@@ -0,0 +1,76 @@
+"""Fusão única dos estagiários repetidos (mesmo nome, universidade e data de admissão), sem Streamlit.
+
+Uso: python deduplicar.py [--banco estagiarios.db] [--simular] [--saida duplicatas.csv]
+
+Aplica as migrações pendentes: a que cria o índice único da chave de identidade funde antes os repetidos (o mais
+antigo fica com o id, os demais vão para o histórico como exclusões), e a partir dela a base não volta a ter
+duplicatas. Com --simular só lista os grupos que seriam fundidos, sem gravar nada (também em bancos ainda não
+migrados), para conferir antes de atualizar o app.
+
+Código de saída: 0 concluído, 1 erro.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from estagiarios import configuracao
+from estagiarios.banco import executar_escrita, get_db_connection, get_pool
+from estagiarios.dados import agrupar_duplicatas, deduplicar_estagiarios
+from estagiarios.migracoes import init_db
+
+SAIDA_OK = 0
+SAIDA_ERRO = 1
+
+
+def contar_estagiarios() -> int:
+    with get_db_connection() as conn:
+        return conn.execute("SELECT count(*) FROM estagiarios").fetchone()[0]
+
+def simular(saida: str) -> int:
+    with get_db_connection() as conn:
+        df = pd.read_sql_query("SELECT id, nome, universidade, data_admissao, data_ult_renovacao, obs, data_vencimento FROM estagiarios", conn)
+    fundidos, removidos = agrupar_duplicatas(df)
+    print(f"{len(removidos)} registros repetidos seriam fundidos em {len(fundidos)} estagiários (base com {len(df)})")
+    for r in fundidos.sort_values('quantidade', ascending=False).head(20).itertuples(index=False):
+        print(f"  ID {r.id}: {r.nome} / {r.universidade} / {r.data_admissao} ({r.quantidade} registros)")
+    if saida and not fundidos.empty:
+        fundidos.to_csv(saida, index=False, encoding="utf-8-sig")
+        print(f"Grupos gravados em {saida}")
+    return SAIDA_OK
+
+def executar(args) -> int:
+    inicio = time.perf_counter()
+    if not configuracao.DB_PRIMARY_URL and not os.path.exists(configuracao.DB_FILE):
+        print(f"Banco não encontrado: {configuracao.DB_FILE}", file=sys.stderr)
+        return SAIDA_ERRO
+    if args.simular: return simular(args.saida)
+    antes = contar_estagiarios()
+    init_db()
+    # Já migrado: não sobra nada para fundir, mas a chamada é barata e deixa o script idempotente
+    executar_escrita(deduplicar_estagiarios)
+    depois = contar_estagiarios()
+    print(f"{antes - depois} registros repetidos fundidos; {depois} estagiários na base")
+    print(f"Concluído em {time.perf_counter() - inicio:.1f}s")
+    return SAIDA_OK
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fusão dos estagiários repetidos e criação do índice único de identidade")
+    parser.add_argument("--banco", help="arquivo SQLite (padrão: ESTAGIARIOS_DB_FILE ou o caminho configurado)")
+    parser.add_argument("--simular", action="store_true", help="só lista os grupos repetidos, sem gravar nada")
+    parser.add_argument("--saida", help="com --simular, grava os grupos (registro fundido e quantidade) neste CSV")
+    args = parser.parse_args()
+    if args.banco: configuracao.DB_FILE = args.banco
+    try:
+        return executar(args)
+    except Exception as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return SAIDA_ERRO
+    finally:
+        # Espera a fila de escrita esvaziar antes de sair (a thread de escrita é daemon)
+        get_pool().fechar()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""Camada de dados do Controle de Estagiários, sem dependência do Streamlit.
+
+Os submódulos são importados sob demanda (``from estagiarios import dados``): ``configuracao``, ``metricas`` e
+``banco`` usam só a biblioteca padrão; pandas entra com ``status``/``dados``, e openpyxl e pytz só quando uma
+planilha é gerada ou um horário local é gravado.
+"""
@@ -0,0 +1,84 @@
+"""Backup online do SQLite: download sob demanda e cópia diária rotativa."""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import date, datetime
+from typing import Optional
+
+from . import configuracao
+from .banco import executar_escrita, get_config, get_db_connection, reservar_tarefa_do_dia
+from .configuracao import (
+    BACKUP_AUTOMATICO_KEY, BACKUP_CHUNK_SIZE, BACKUP_DATA_KEY, BACKUP_DIR_NAME, BACKUP_KEEP, BACKUP_PAGES_PER_STEP,
+    fuso_horario,
+)
+from .metricas import instrumentado
+
+_backup_verificado_em: Optional[str] = None
+
+# ==========================
+# Backup
+# ==========================
+@instrumentado
+def gerar_backup(destino: str, compactar: bool = False):
+    # API de backup online do SQLite: cópia consistente (inclui o conteúdo do -wal) feita em passos, sem travar quem escreve
+    temporario = destino + ".tmp"
+    with get_db_connection() as origem:
+        origem.execute("BEGIN")
+        origem.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        try:
+            copia = sqlite3.connect(temporario)
+            try:
+                origem.backup(copia, pages=BACKUP_PAGES_PER_STEP, sleep=0.005)
+            finally:
+                copia.close()
+        finally:
+            origem.rollback()
+    if compactar:
+        with open(temporario, "rb") as entrada, gzip.open(destino, "wb") as saida:
+            shutil.copyfileobj(entrada, saida, BACKUP_CHUNK_SIZE)
+        os.remove(temporario)
+    else:
+        os.replace(temporario, destino)
+
+def backup_para_download(compactar: bool = False) -> bytes:
+    # O st.download_button lê o conteúdo inteiro de qualquer forma; devolver bytes fecha o arquivo e apaga o
+    # diretório temporário aqui mesmo (no Windows um arquivo aberto não pode ser removido)
+    diretorio = tempfile.mkdtemp(prefix="backup_estagiarios_")
+    try:
+        destino = os.path.join(diretorio, "backup.db.gz" if compactar else "backup.db")
+        gerar_backup(destino, compactar)
+        with open(destino, "rb") as arquivo:
+            return arquivo.read()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+def diretorio_backups() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(configuracao.DB_FILE)), BACKUP_DIR_NAME)
+
+def listar_backups() -> list:
+    diretorio = diretorio_backups()
+    if not os.path.isdir(diretorio): return []
+    return sorted((f for f in os.listdir(diretorio) if f.startswith("estagiarios_") and f.endswith(".db.gz")), reverse=True)
+
+def backup_rotativo(manter: int = BACKUP_KEEP) -> str:
+    diretorio = diretorio_backups()
+    os.makedirs(diretorio, exist_ok=True)
+    destino = os.path.join(diretorio, f"estagiarios_{datetime.now(fuso_horario()).strftime('%Y%m%d_%H%M%S')}.db.gz")
+    gerar_backup(destino, compactar=True)
+    for antigo in listar_backups()[manter:]:
+        os.remove(os.path.join(diretorio, antigo))
+    return destino
+
+@instrumentado
+def agendar_backup_diario():
+    # Com o backup automático ligado, o primeiro processo do dia dispara a cópia numa thread, sem bloquear o rerun
+    global _backup_verificado_em
+    hoje = date.today().isoformat()
+    if _backup_verificado_em == hoje: return
+    _backup_verificado_em = hoje
+    if get_config(BACKUP_AUTOMATICO_KEY, "0") != "1" or get_config(BACKUP_DATA_KEY) == hoje: return
+    if not executar_escrita(lambda conn: reservar_tarefa_do_dia(conn, BACKUP_DATA_KEY, hoje)): return
+    threading.Thread(target=backup_rotativo, name="backup-diario", daemon=True).start()
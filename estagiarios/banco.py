@@ -0,0 +1,432 @@
+"""Acesso ao banco: pool de conexões (SQLite local ou primário libsql com réplica), fila de escrita e config."""
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as PrazoEsgotado
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from . import configuracao
+from .configuracao import (
+    DB_CACHE_SIZE_KB, DB_CACHED_STATEMENTS, DB_MMAP_SIZE, DB_READ_POOL_SIZE, DB_REPLICA_BATCH_SIZE,
+    DB_REPLICA_SYNC_SECONDS, DB_WRITE_GROUP_SIZE, DB_WRITE_TIMEOUT,
+)
+from .metricas import ConexaoInstrumentada, instrumentado, medicao_atual, usar_medicao
+
+# ==========================
+# Banco de Dados (Arquitetura Robusta)
+# ==========================
+class PoolConexoes:
+    """Uma conexão de escrita e um pool pequeno de conexões de leitura, abertas uma única vez por processo."""
+
+    url_primario = ""
+
+    def __init__(self, db_file: str, tamanho_leitura: int = DB_READ_POOL_SIZE):
+        self.db_file = db_file
+        self.tamanho_leitura = tamanho_leitura
+        self._leitores: queue.LifoQueue = queue.LifoQueue()
+        self._leitores_criados = 0
+        self._escritor: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._lock_escrita = threading.RLock()
+        self.conexoes_abertas = 0
+        self.total_conexoes_criadas = 0
+        self.escritor = EscritorEmGrupo(self)
+        # Tabela config de cada conexão de leitura, com o PRAGMA data_version em que foi lida
+        self._config_por_conexao: Dict[int, Tuple[int, Dict[str, str]]] = {}
+        self.total_leituras_config = 0
+
+    def _abrir(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=10, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS, factory=ConexaoInstrumentada)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE_KB * -1};")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE};")
+        with self._lock:
+            self.conexoes_abertas += 1
+            self.total_conexoes_criadas += 1
+        return conn
+
+    @contextmanager
+    def leitura(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._leitores.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                criar = self._leitores_criados < self.tamanho_leitura
+                if criar: self._leitores_criados += 1
+            conn = self._abrir() if criar else self._leitores.get()
+        self._antes_da_leitura()
+        try:
+            yield conn
+        finally:
+            self._leitores.put(conn)
+
+    @contextmanager
+    def escrita(self) -> Iterator[sqlite3.Connection]:
+        with self._lock_escrita:
+            if self._escritor is None: self._escritor = self._abrir_escritor()
+            try:
+                yield self._escritor
+                self._escritor.commit()
+            except Exception:
+                self._escritor.rollback()
+                raise
+        # Fora do lock: a sincronização da réplica não segura a próxima escrita
+        self._apos_commit()
+
+    def _abrir_escritor(self) -> sqlite3.Connection:
+        return self._abrir()
+
+    def config(self) -> Dict[str, str]:
+        # O data_version de uma conexão muda sempre que outra conexão, deste ou de outro processo (outra réplica do
+        # Streamlit, o lote noturno), grava no banco. Sem mudança a cópia vale, e o PRAGMA não lê nenhuma página;
+        # as leituras só usam conexões de leitura, então as escritas deste processo também são percebidas
+        with self.leitura() as conn:
+            versao = conn.execute("PRAGMA data_version").fetchone()[0]
+            em_cache = self._config_por_conexao.get(id(conn))
+            if em_cache is None or em_cache[0] != versao:
+                em_cache = (versao, {row['key']: row['value'] for row in conn.execute("SELECT key, value FROM config")})
+                self._config_por_conexao[id(conn)] = em_cache
+                self.total_leituras_config += 1
+            return em_cache[1]
+
+    def _antes_da_leitura(self):
+        pass
+
+    def _apos_commit(self):
+        pass
+
+    def fechar(self):
+        self.escritor.parar()
+        with self._lock_escrita:
+            if self._escritor is not None:
+                self._escritor.close()
+                self._escritor = None
+                self.conexoes_abertas -= 1
+        while True:
+            try:
+                self._leitores.get_nowait().close()
+            except queue.Empty:
+                break
+            self.conexoes_abertas -= 1
+            self._leitores_criados -= 1
+        self._config_por_conexao.clear()
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {"abertas": self.conexoes_abertas, "criadas": self.total_conexoes_criadas, "leitores": self._leitores_criados,
+                "escritas": self.escritor.total_escritas, "commits": self.escritor.total_commits, "leituras_config": self.total_leituras_config}
+
+# Diário de alterações do primário: cada id de estagiário inserido, alterado ou excluído ganha o próximo seq,
+# mantido por triggers. Uma linha por id, então o diário não passa do número de ids que já existiram; o id excluído
+# continua lá e serve de marca de exclusão para a réplica. O calendário de um id só muda com o próprio cadastro ou
+# com as regras, e a mudança de regra marca os ids afetados com registrar_alteracoes (sem trigger por evento).
+# Só o backend de réplica lê o diário, então só ele cria os triggers (instalar_diario); no banco local nada é anotado
+ALTERACOES_TABELA = "estagiarios_alteracoes"
+# Upsert e não INSERT OR REPLACE: dentro de um trigger o tratamento de conflito do comando externo (o upsert da
+# importação) prevaleceria sobre o OR REPLACE
+_MARCAR_ALTERACAO = f"INSERT INTO {ALTERACOES_TABELA}(id, seq) SELECT {{}} ON CONFLICT(id) DO UPDATE SET seq = excluded.seq"
+ALTERACOES_SCHEMA = [
+    f"CREATE TABLE IF NOT EXISTS {ALTERACOES_TABELA} (id INTEGER PRIMARY KEY, seq INTEGER NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS idx_{ALTERACOES_TABELA}_seq ON {ALTERACOES_TABELA}(seq)",
+]
+ALTERACOES_TRIGGERS = {
+    f"trg_estagiarios_{evento.lower()}_alteracao": f"CREATE TRIGGER IF NOT EXISTS trg_estagiarios_{evento.lower()}_alteracao AFTER {evento} ON estagiarios BEGIN "
+    + _MARCAR_ALTERACAO.format(f"{linha}.id, coalesce(max(seq), 0) + 1 FROM {ALTERACOES_TABELA} WHERE true") + "; END"
+    for evento, linha in [("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")]
+}
+
+def instalar_diario(conn) -> bool:
+    # Cria os triggers que faltam; True se algum foi criado, e então o diário não tem as alterações anteriores
+    existentes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    faltando = [sql for nome, sql in ALTERACOES_TRIGGERS.items() if nome not in existentes]
+    for sql in faltando:
+        conn.execute(sql)
+    return bool(faltando)
+
+def registrar_alteracoes(conn: sqlite3.Connection, filtro: str, params: tuple = ()):
+    # Marca no diário os ids do filtro, todos com o mesmo seq novo, na transação de quem chamou. Sem os triggers
+    # (banco local) o diário não é mantido
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (next(iter(ALTERACOES_TRIGGERS)),)).fetchone(): return
+    conn.execute(_MARCAR_ALTERACAO.format(f"id, (SELECT coalesce(max(seq), 0) + 1 FROM {ALTERACOES_TABELA}) FROM estagiarios {filtro or 'WHERE true'}"), params)
+
+# Marcadores lidos do primário: a réplica só recopia a tabela cujo marcador mudou desde a última sincronização
+MARCADORES_REPLICA = {
+    "config": "SELECT group_concat(key || '=' || coalesce(value, ''), ';') FROM config",
+    "regras": "SELECT group_concat(value, '/') FROM config WHERE key IN ('regras_versao', 'schema_version')",
+    "estagiarios": f"SELECT 'seq:' || coalesce(max(seq), 0) FROM {ALTERACOES_TABELA}",
+    "calendario_renovacoes": f"SELECT 'seq:' || coalesce(max(seq), 0) FROM {ALTERACOES_TABELA}",
+    "logs": "SELECT count(*) || ':' || coalesce(max(id), 0) FROM logs",
+    "logs_arquivo": "SELECT count(*) || ':' || total(quantidade) FROM logs_arquivo",
+    "estagiarios_history": "SELECT count(*) || ':' || coalesce(max(history_id), 0) FROM estagiarios_history",
+}
+# Tabelas que só crescem: a réplica traz apenas as linhas com chave maior que a última copiada
+REPLICA_INCREMENTAIS = {"logs": "id", "estagiarios_history": "history_id"}
+# Tabelas alteradas no lugar: o marcador é o último seq do diário, e a réplica recopia só os ids com seq maior
+REPLICA_POR_ALTERACOES = {"estagiarios", "calendario_renovacoes"}
+
+class PoolReplicaLibsql(PoolConexoes):
+    """Backend libsql/Turso: as escritas vão para o primário remoto e as leituras são servidas por uma réplica SQLite local."""
+
+    def __init__(self, db_file: str, url_primario: str, auth_token: str = "", tamanho_leitura: int = DB_READ_POOL_SIZE):
+        super().__init__(db_file, tamanho_leitura)
+        self.url_primario = url_primario
+        self.auth_token = auth_token
+        self._replica: Optional[sqlite3.Connection] = None
+        # Conexão própria com o primário: a sincronização não disputa a conexão (nem o lock) de escrita
+        self._primario: Optional[Any] = None
+        self._lock_sincronizacao = threading.RLock()
+        self._ultima_sincronizacao = 0.0
+        self.total_sincronizacoes = 0
+        self.erro_sincronizacao = ""
+        self._sincronizar_com_tolerancia()
+
+    def _abrir_escritor(self):
+        from libsql_client import dbapi2  # dependência opcional: só necessária com ESTAGIARIOS_DB_URL
+        extras = {"auth_token": self.auth_token} if self.auth_token else {}
+        conn = dbapi2.connect(self.url_primario, uri=True, timeout=10, check_same_thread=False, **extras)
+        conn.row_factory = sqlite3.Row if isinstance(conn, sqlite3.Connection) else dbapi2.Row
+        with self._lock:
+            self.conexoes_abertas += 1
+            self.total_conexoes_criadas += 1
+        return conn
+
+    def _antes_da_leitura(self):
+        # Alterações feitas por outras instâncias chegam no máximo DB_REPLICA_SYNC_SECONDS depois; leitura nunca espera a escrita
+        if time.monotonic() - self._ultima_sincronizacao < DB_REPLICA_SYNC_SECONDS: return
+        if not self._lock_sincronizacao.acquire(blocking=False): return
+        try:
+            self._sincronizar_com_tolerancia()
+        finally:
+            self._lock_sincronizacao.release()
+
+    def _apos_commit(self):
+        # Quem acabou de escrever lê o próprio dado na réplica
+        self._sincronizar_com_tolerancia()
+
+    def _sincronizar_com_tolerancia(self):
+        # Primário fora do ar não derruba as leituras: a réplica segue servindo a última cópia
+        try:
+            self.sincronizar()
+            self.erro_sincronizacao = ""
+        except Exception as e:
+            self.erro_sincronizacao = str(e)
+        self._ultima_sincronizacao = time.monotonic()
+
+    def sincronizar(self):
+        with self._lock_sincronizacao:
+            if self._primario is None: self._primario = self._abrir_escritor()
+            if self._replica is None:
+                self._replica = self._abrir()
+                self._replica.execute("CREATE TABLE IF NOT EXISTS replica_marcadores (tabela TEXT PRIMARY KEY, marcador TEXT)")
+                self._replica.commit()
+            primario, replica = self._primario, self._replica
+            # Sem os triggers: na réplica as linhas só chegam pela cópia
+            esquema = {row['name']: (row['type'], row['tbl_name'], row['sql']) for row in primario.execute(
+                "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' AND type <> 'trigger'")}
+            if "config" not in esquema: return
+            # Triggers do diário recém-criados: o que mudou antes deles não foi anotado, então as tabelas
+            # acompanhadas pelo diário são recopiadas inteiras
+            diario_novo = ALTERACOES_TABELA in esquema and "estagiarios" in esquema and instalar_diario(primario)
+            if diario_novo: primario.commit()
+            locais = {row['name']: row['sql'] for row in replica.execute("SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL")}
+            marcadores = {row['tabela']: row['marcador'] for row in replica.execute("SELECT tabela, marcador FROM replica_marcadores")}
+            if diario_novo:
+                for tabela in REPLICA_POR_ALTERACOES: marcadores.pop(tabela, None)
+            with replica:
+                recriadas = set()
+                for nome, (tipo, tabela, sql) in sorted(esquema.items(), key=lambda item: item[1][0] != "table"):
+                    if locais.get(nome) == sql and tabela not in recriadas: continue
+                    if nome in locais: replica.execute(f"DROP {tipo.upper()} IF EXISTS {nome}")
+                    replica.execute(sql)
+                    if tipo == "table":
+                        recriadas.add(tabela)
+                        marcadores.pop(tabela, None)
+                for tabela, consulta in MARCADORES_REPLICA.items():
+                    if tabela not in esquema: continue
+                    # Primário ainda sem o diário (migração pendente): a tabela espera a próxima sincronização
+                    if tabela in REPLICA_POR_ALTERACOES and ALTERACOES_TABELA not in esquema: continue
+                    marcador = primario.execute(consulta).fetchone()[0] or ""
+                    anterior = marcadores.get(tabela)
+                    if anterior == marcador: continue
+                    # seq menor que o copiado: o diário foi esvaziado no primário, e a tabela é recopiada inteira
+                    if tabela in REPLICA_POR_ALTERACOES and anterior and anterior.startswith("seq:") and int(marcador[4:]) >= int(anterior[4:]):
+                        # Ids alterados desde o último seq copiado; o excluído no primário sai da réplica e não volta
+                        ids = json.dumps([row[0] for row in primario.execute(f"SELECT id FROM {ALTERACOES_TABELA} WHERE seq > ?", (int(anterior[4:]),))])
+                        self._copiar_tabela(primario, replica, tabela, "WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+                    elif tabela in REPLICA_INCREMENTAIS and anterior is not None:
+                        chave = REPLICA_INCREMENTAIS[tabela]
+                        ultimo_id = replica.execute(f"SELECT coalesce(max({chave}), 0) FROM {tabela}").fetchone()[0]
+                        self._copiar_tabela(primario, replica, tabela, f"WHERE {chave} > ?", (ultimo_id,))
+                        # Linhas removidas no primário (logs arquivados) não aparecem no incremental: recopia a tabela inteira
+                        if replica.execute(consulta).fetchone()[0] != marcador:
+                            self._copiar_tabela(primario, replica, tabela)
+                    else:
+                        self._copiar_tabela(primario, replica, tabela)
+                    replica.execute("INSERT OR REPLACE INTO replica_marcadores(tabela, marcador) VALUES (?, ?)", (tabela, marcador))
+            self.total_sincronizacoes += 1
+
+    def _copiar_tabela(self, primario, replica: sqlite3.Connection, tabela: str, filtro: str = "", params: tuple = ()):
+        # Substitui na réplica as linhas do filtro pelas do primário (sem filtro: a tabela inteira)
+        replica.execute(f"DELETE FROM {tabela} {filtro}", params)
+        cursor = primario.execute(f"SELECT * FROM {tabela} {filtro}", params)
+        colunas = [d[0] for d in cursor.description]
+        query = f"INSERT INTO {tabela}({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+        while True:
+            lote = cursor.fetchmany(DB_REPLICA_BATCH_SIZE)
+            if not lote: break
+            replica.executemany(query, [tuple(row) for row in lote])
+
+    def fechar(self):
+        super().fechar()
+        with self._lock_sincronizacao:
+            for conn in [self._replica, self._primario]:
+                if conn is None: continue
+                conn.close()
+                self.conexoes_abertas -= 1
+            self._replica = self._primario = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {**super().estatisticas(), "sincronizacoes": self.total_sincronizacoes, "erro_sincronizacao": self.erro_sincronizacao}
+
+class EscritorEmGrupo:
+    """Thread única dona da conexão de escrita: as escritas de todas as sessões entram numa fila e são gravadas em commits agrupados."""
+
+    def __init__(self, pool: PoolConexoes, tamanho_grupo: int = DB_WRITE_GROUP_SIZE):
+        self.pool = pool
+        self.tamanho_grupo = tamanho_grupo
+        self._fila: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.total_escritas = 0
+        self.total_commits = 0
+
+    def enviar(self, tarefa: Callable[[sqlite3.Connection], Any]) -> Future:
+        futuro: Future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name="escritor-sqlite", daemon=True)
+                self._thread.start()
+            # Com a medição do rerun que enviou: o SQL da tarefa conta no rerun, mesmo rodando em outra thread
+            self._fila.put((tarefa, futuro, medicao_atual()))
+        return futuro
+
+    def parar(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None: self._fila.put(None)
+        if thread is not None: thread.join()
+
+    def _executar(self):
+        while True:
+            grupo = [self._fila.get()]
+            while grupo[-1] is not None and len(grupo) < self.tamanho_grupo:
+                try:
+                    grupo.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            parar = grupo[-1] is None
+            if parar: grupo.pop()
+            if grupo: self._gravar_grupo(grupo)
+            if parar: return
+
+    def _gravar_grupo(self, grupo: list):
+        # Cada tarefa roda num SAVEPOINT: a que falhar é desfeita sozinha e as demais saem no mesmo commit
+        resultados = []
+        try:
+            with self.pool.escrita() as conn:
+                if not conn.in_transaction: conn.execute("BEGIN")
+                for tarefa, futuro, medicao in grupo:
+                    if not futuro.set_running_or_notify_cancel(): continue
+                    conn.execute("SAVEPOINT tarefa")
+                    try:
+                        with usar_medicao(medicao):
+                            resultados.append((futuro, tarefa(conn), None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO tarefa")
+                        resultados.append((futuro, None, e))
+                    conn.execute("RELEASE tarefa")
+        except Exception as e:
+            # Falha no BEGIN/COMMIT: nada do grupo foi gravado
+            for _, futuro, _ in grupo:
+                if not futuro.done(): futuro.set_exception(e)
+            return
+        self.total_escritas += len(resultados)
+        self.total_commits += 1
+        for futuro, resultado, erro in resultados:
+            if erro is None: futuro.set_result(resultado)
+            else: futuro.set_exception(erro)
+
+# Pool único do processo: o módulo é importado uma vez, então sobrevive aos reruns do Streamlit
+_pool: Optional[PoolConexoes] = None
+_pool_lock = threading.Lock()
+
+def criar_pool() -> PoolConexoes:
+    # Backend de armazenamento: SQLite local, ou libsql/Turso como primário com DB_FILE como réplica de leitura
+    if configuracao.DB_PRIMARY_URL: return PoolReplicaLibsql(configuracao.DB_FILE, configuracao.DB_PRIMARY_URL, configuracao.DB_AUTH_TOKEN)
+    return PoolConexoes(configuracao.DB_FILE)
+
+def get_pool() -> PoolConexoes:
+    global _pool
+    with _pool_lock:
+        pool = _pool
+        if pool is None or pool.db_file != configuracao.DB_FILE or pool.url_primario != configuracao.DB_PRIMARY_URL:
+            if pool is not None: pool.fechar()
+            _pool = pool = criar_pool()
+        return pool
+
+def get_db_connection():
+    return get_pool().leitura()
+
+def enviar_escrita(tarefa: Callable[[sqlite3.Connection], Any]) -> Future:
+    return get_pool().escritor.enviar(tarefa)
+
+class ErroEscrita(RuntimeError):
+    """Falha ao gravar no banco; a interface mostra a mensagem e interrompe a página."""
+
+class EscritaEmAndamento(ErroEscrita):
+    """O prazo acabou com a tarefa já rodando na thread de escrita: ela ainda pode ser gravada, não falhou."""
+
+def aguardar_escrita(futuro: Future, timeout: float = DB_WRITE_TIMEOUT) -> Any:
+    # No prazo esgotado, a tarefa que ainda está na fila é cancelada (_gravar_grupo pula as canceladas) e nada é
+    # gravado. Se já começou a rodar não há como desfazer daqui, e o commit ainda pode acontecer
+    try:
+        return futuro.result(timeout=timeout)
+    except PrazoEsgotado:
+        if futuro.cancel(): raise ErroEscrita(f"a fila de escrita não respondeu em {timeout}s; nada foi gravado") from None
+        raise EscritaEmAndamento(f"a gravação ainda está em andamento após {timeout}s e pode ser concluída; confira antes de repetir") from None
+    except Exception as e:
+        raise ErroEscrita(str(e)) from e
+
+@instrumentado
+def executar_escrita(tarefa: Callable[[sqlite3.Connection], Any]) -> Any:
+    # A tarefa roda na thread de escrita, numa transação própria (SAVEPOINT) dentro do próximo commit em grupo
+    return aguardar_escrita(enviar_escrita(tarefa))
+
+def execute_write_query(query: str, params: tuple = ()):
+    executar_escrita(lambda conn: conn.execute(query, params).rowcount)
+
+@instrumentado
+def get_config(key: str, default: Optional[str] = None) -> str:
+    # As chaves de versão (regras, dados) guardam os caches em memória dos módulos; lê-las por aqui custa um PRAGMA
+    # e vale entre processos, então cada processo mantém seus caches e só recarrega o que outro processo mudou
+    value = get_pool().config().get(key)
+    return value if value is not None else (default if default is not None else "")
+
+@instrumentado
+def set_config(key: str, value: str):
+    execute_write_query("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", (key, value))
+
+VERSAO_UPSERT_QUERY = "INSERT INTO config(key, value) VALUES(?, '1') ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+
+def incrementar_versao(key: str):
+    execute_write_query(VERSAO_UPSERT_QUERY, (key,))
+
+def reservar_tarefa_do_dia(conn: sqlite3.Connection, key: str, hoje: str) -> bool:
+    # Grava a data em config só se ainda não estiver lá; True para o único processo que conseguiu gravar
+    return conn.execute(
+        "INSERT INTO config(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value WHERE value IS NOT excluded.value",
+        (key, hoje)).rowcount == 1
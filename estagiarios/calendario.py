@@ -0,0 +1,106 @@
+"""Calendário de renovações e términos: uma linha por estagiário por evento do contrato, mantida a cada escrita."""
+import sqlite3
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from .banco import get_config, get_db_connection
+from .configuracao import CALENDARIO_MESES, DADOS_VERSAO_KEY, DASHBOARD_PAGE_SIZE
+from .metricas import instrumentado
+from .status import ler_contratos, ler_regras_meses, meses_por_universidade_serie, somar_meses
+
+# ==========================
+# Calendário de Renovações
+# ==========================
+EVENTO_RENOVACAO = "Renovação"
+EVENTO_TERMINO = "Término"
+EVENTOS = [EVENTO_RENOVACAO, EVENTO_TERMINO]
+
+CALENDARIO_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS calendario_renovacoes (id INTEGER NOT NULL, data TEXT NOT NULL, evento TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_calendario_renovacoes_data_evento ON calendario_renovacoes(data, evento)",
+    "CREATE INDEX IF NOT EXISTS idx_calendario_renovacoes_id ON calendario_renovacoes(id)",
+]
+
+# Linha do tempo já agregada, por (versão dos dados, início, fim)
+_semanas_em_cache: Tuple[Optional[str], Dict[Tuple[date, date], pd.DataFrame]] = (None, {})
+
+def calcular_eventos(df: pd.DataFrame, regras_meses: Dict[str, int]) -> pd.DataFrame:
+    # Mesmas regras de calcular_proxima_renovacao e calcular_vencimento_final, mas com todos os ciclos do contrato:
+    # renovação a cada 6 meses desde a última (ou da admissão) até o limite de 2 anos, e o término.
+    # Não depende da data de hoje, então a tabela só muda quando o contrato ou as regras mudam
+    data_adm = df['data_admissao'].dt.normalize()
+    limite_2_anos = somar_meses(data_adm, 24)
+    base = df['data_ult_renovacao'].dt.normalize().fillna(data_adm)
+    renovavel = data_adm.notna() & (meses_por_universidade_serie(df['universidade'], regras_meses) < 24)
+    partes = []
+    for ciclo in range(1, 24 // 6 + 1):
+        data = somar_meses(base, 6 * ciclo)
+        no_prazo = renovavel & (data <= limite_2_anos)
+        partes.append(pd.DataFrame({'id': df['id'][no_prazo], 'data': data[no_prazo], 'evento': EVENTO_RENOVACAO}))
+    termino = df['data_vencimento'].dt.normalize().fillna(limite_2_anos)
+    partes.append(pd.DataFrame({'id': df['id'][termino.notna()], 'data': termino[termino.notna()], 'evento': EVENTO_TERMINO}))
+    eventos = pd.concat(partes, ignore_index=True)
+    eventos['data'] = eventos['data'].dt.strftime('%Y-%m-%d')
+    return eventos
+
+@instrumentado
+def atualizar_calendario(conn: sqlite3.Connection, filtro: str = "", params: tuple = ()):
+    # Refaz os eventos das linhas do filtro, dentro da transação de quem chamou (sem filtro: a base inteira)
+    if filtro:
+        conn.execute(f"DELETE FROM calendario_renovacoes WHERE id IN (SELECT id FROM estagiarios {filtro})", params)
+    else:
+        conn.execute("DELETE FROM calendario_renovacoes")
+    df = ler_contratos(conn, filtro, params)
+    if df.empty: return
+    # Na ordem do índice (data, evento), que assim cresce sem reorganizar páginas
+    eventos = calcular_eventos(df, ler_regras_meses(conn)).sort_values(['data', 'evento'])
+    conn.executemany("INSERT INTO calendario_renovacoes(id, data, evento) VALUES (?, ?, ?)",
+                     zip(eventos['id'].tolist(), eventos['data'], eventos['evento']))
+
+def remover_do_calendario(conn: sqlite3.Connection, est_id: int):
+    conn.execute("DELETE FROM calendario_renovacoes WHERE id=?", (int(est_id),))
+
+# ==========================
+# Consultas por Período
+# ==========================
+def periodo_padrao(hoje: Optional[date] = None) -> Tuple[date, date]:
+    hoje = hoje or date.today()
+    return hoje, hoje + relativedelta(months=CALENDARIO_MESES)
+
+@instrumentado
+def eventos_por_semana(inicio: date, fim: date) -> pd.DataFrame:
+    # Contagem por semana (começando na segunda) e evento. O SQL agrega por dia na ordem do índice (data, evento),
+    # sem ordenação temporária, e o resultado fica em memória até uma escrita incrementar a versão dos dados
+    global _semanas_em_cache
+    versao = get_config(DADOS_VERSAO_KEY, "0")
+    if _semanas_em_cache[0] != versao:
+        _semanas_em_cache = (versao, {})
+    if (inicio, fim) not in _semanas_em_cache[1]:
+        with get_db_connection() as conn:
+            df = pd.read_sql_query(
+                "SELECT data, evento, count(*) AS quantidade FROM calendario_renovacoes WHERE data >= ? AND data <= ? GROUP BY data, evento",
+                conn, params=(inicio.isoformat(), fim.isoformat()))
+        df['semana'] = pd.to_datetime(df['data']).dt.to_period('W-SUN').dt.start_time
+        semanas = pd.date_range(pd.Timestamp(inicio) - pd.Timedelta(days=inicio.weekday()), pd.Timestamp(fim), freq='W-MON')
+        por_semana = df.pivot_table(index='semana', columns='evento', values='quantidade', aggfunc='sum')
+        _semanas_em_cache[1][(inicio, fim)] = por_semana.reindex(index=semanas, columns=EVENTOS).fillna(0).astype(int)
+    return _semanas_em_cache[1][(inicio, fim)]
+
+@instrumentado
+def eventos_no_periodo(inicio: date, fim: date, evento: Optional[str] = None, limite: Optional[int] = DASHBOARD_PAGE_SIZE, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+    filtro, params = "WHERE c.data >= ? AND c.data <= ?", [inicio.isoformat(), fim.isoformat()]
+    if evento:
+        filtro += " AND c.evento = ?"
+        params.append(evento)
+    paginacao = f"LIMIT {int(limite)} OFFSET {int(offset)}" if limite else ""
+    with get_db_connection() as conn:
+        total = conn.execute(f"SELECT count(*) FROM calendario_renovacoes c {filtro}", params).fetchone()[0]
+        df = pd.read_sql_query(
+            f"SELECT c.data, c.evento, e.id, e.nome, e.universidade FROM calendario_renovacoes c JOIN estagiarios e ON e.id = c.id "
+            f"{filtro} ORDER BY c.data, e.nome {paginacao}",
+            conn, params=params)
+    df['data'] = pd.to_datetime(df['data'])
+    return df, total
@@ -0,0 +1,66 @@
+"""Configurações e constantes da camada de dados.
+
+Só biblioteca padrão: importar este módulo não carrega pandas nem Streamlit. DB_FILE e DB_PRIMARY_URL são lidos
+como ``configuracao.DB_FILE`` na hora do uso, então reatribuí-los (como faz o benchmark) troca o banco usado.
+"""
+import functools
+import os
+
+# ==========================
+# Configurações e Constantes
+# ==========================
+# ***** CAMINHO ABSOLUTO DEFINITIVO APLICADO *****
+# Arquivo padrão do banco; a variável de ambiente ESTAGIARIOS_DB_FILE aponta para outro sem editar o código.
+DB_FILE = os.environ.get("ESTAGIARIOS_DB_FILE", "H:/GUILHERME PITA/6.EstagiariosApp/estagiarios.db")
+# Com ESTAGIARIOS_DB_URL (libsql://, wss://, ws:// ou file:) o banco principal passa a ser o libsql/Turso
+# e DB_FILE vira a réplica local que atende as leituras.
+DB_PRIMARY_URL = os.environ.get("ESTAGIARIOS_DB_URL", "")
+DB_AUTH_TOKEN = os.environ.get("ESTAGIARIOS_DB_TOKEN", "")
+DB_REPLICA_SYNC_SECONDS = 5
+DB_REPLICA_BATCH_SIZE = 1000
+
+DB_READ_POOL_SIZE = 4
+DB_CACHED_STATEMENTS = 256
+DB_CACHE_SIZE_KB = 16000
+DB_MMAP_SIZE = 64 * 1024 * 1024
+DB_WRITE_GROUP_SIZE = 64
+DB_WRITE_TIMEOUT = 30
+ESTAGIARIOS_COLUNAS = "id, nome, universidade, data_admissao, data_ult_renovacao, obs, data_vencimento"
+COLUNAS_STATUS = ['proxima_renovacao', 'status', 'ultimo_ano']
+DEFAULT_PROXIMOS_DIAS = 30
+DEFAULT_DURATION_OTHERS = 6
+IMPORT_BATCH_SIZE = 500
+IMPORT_CHUNK_SIZE = 5000
+STATUS_BATCH_SIZE = 5000
+STATUS_RELATORIO = ('Vencido', 'Venc.Proximo')
+CALENDARIO_MESES = 12
+COLUNAS_EXIBICAO = ['ID', 'Nome', 'Universidade', 'Data Admissão', 'Renovado em:', 'Status', 'Ultimo Ano?', 'Proxima Renovação', 'Termino de Contrato', 'Observação']
+LOG_EXPORT_BATCH_SIZE = 5000
+LOG_EXPORT_COLUNAS = ["timestamp", "action", "details"]
+LOG_EXPORT_FORMATOS = {"txt": ("Texto (.txt)", "text/plain"), "csv": ("CSV (.csv)", "text/csv"), "ndjson": ("NDJSON (.ndjson)", "application/x-ndjson")}
+LOG_BUFFERED = False
+LOG_BUFFER_SIZE = 100
+LOG_BUFFER_SECONDS = 5
+LOG_RETENCAO_MESES = 6
+SEARCH_PAGE_SIZE = 50
+DASHBOARD_PAGE_SIZE = 100
+SCHEMA_VERSION_KEY = "schema_version"
+REGRAS_VERSAO_KEY = "regras_versao"
+DADOS_VERSAO_KEY = "dados_versao"
+STATUS_DATA_KEY = "status_calculado_em"
+BACKUP_AUTOMATICO_KEY = "backup_automatico"
+BACKUP_DATA_KEY = "backup_realizado_em"
+BACKUP_DIR_NAME = "backups"
+BACKUP_KEEP = 7
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_CHUNK_SIZE = 1024 * 1024
+PERF_SQL_MAX_CHARS = 200
+PERF_CONSULTAS_POR_RERUN = 1000
+PERF_TOP_CONSULTAS = 15
+PERF_LOG_ESTRUTURADO = False
+TIMEZONE_NOME = "America/Sao_Paulo"
+
+@functools.lru_cache(maxsize=None)
+def fuso_horario():
+    import pytz  # só quando um horário local é de fato gerado (logs, nome dos backups)
+    return pytz.timezone(TIMEZONE_NOME)
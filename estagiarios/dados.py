@@ -0,0 +1,347 @@
+"""CRUD de regras e estagiários, consultas paginadas e atualização diária do status."""
+import json
+import sqlite3
+import unicodedata
+from datetime import date
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from .banco import VERSAO_UPSERT_QUERY, executar_escrita, get_config, get_db_connection, registrar_alteracoes, reservar_tarefa_do_dia
+from .calendario import atualizar_calendario, remover_do_calendario
+from .configuracao import (
+    COLUNAS_STATUS, DADOS_VERSAO_KEY, DASHBOARD_PAGE_SIZE, DEFAULT_DURATION_OTHERS, ESTAGIARIOS_COLUNAS,
+    REGRAS_VERSAO_KEY, SEARCH_PAGE_SIZE, STATUS_BATCH_SIZE, STATUS_DATA_KEY,
+)
+from .historico import registrar_historico
+from .logs import arquivar_logs, registrar_log
+from .metricas import instrumentado
+from .status import (
+    calcular_status, chave_universidade, formatar_datas, meses_por_universidade_serie, recalcular_status,
+)
+
+# Caches do processo, invalidados pelas versões gravadas em config
+_indice_regras: Tuple[Optional[str], Dict[str, int]] = (None, {})
+_snapshot_estagiarios: Tuple[Optional[str], pd.DataFrame] = (None, pd.DataFrame())
+_status_calculado_em: Optional[str] = None
+
+# Filtro das linhas cujos ids vêm numa lista JSON (um único parâmetro, qualquer que seja o tamanho da lista)
+FILTRO_IDS = "WHERE id IN (SELECT value FROM json_each(?))"
+
+# ==========================
+# Funções de Lógica e CRUD
+# ==========================
+@instrumentado
+def list_regras() -> pd.DataFrame:
+    with get_db_connection() as conn:
+        return pd.read_sql_query("SELECT id, keyword, meses FROM regras ORDER BY keyword", conn)
+
+@instrumentado
+def get_indice_regras() -> Dict[str, int]:
+    # Índice em memória {universidade normalizada: meses}, reconstruído só quando a versão no config muda
+    global _indice_regras
+    versao = get_config(REGRAS_VERSAO_KEY, "0")
+    if _indice_regras[0] != versao:
+        df_regras = list_regras()
+        indice = {chave_universidade(k): int(m) for k, m in zip(df_regras["keyword"], df_regras["meses"])}
+        _indice_regras = (versao, indice)
+    return _indice_regras[1]
+
+def _recalcular_status_da_regra(conn: sqlite3.Connection, keyword: str):
+    # Só os estagiários cuja universidade corresponde à regra alterada têm o status recalculado
+    chave = chave_universidade(keyword)
+    universidades = [row[0] for row in conn.execute("SELECT DISTINCT universidade FROM estagiarios") if chave_universidade(row[0]) == chave]
+    if not universidades: return
+    filtro = f"WHERE universidade IN ({', '.join('?' * len(universidades))})"
+    recalcular_status(conn, filtro, tuple(universidades))
+    atualizar_calendario(conn, filtro, tuple(universidades))
+    # O calendário depende das regras, não só do cadastro: marca os ids mesmo onde o status gravado não mudou
+    registrar_alteracoes(conn, filtro, tuple(universidades))
+    conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+
+def add_regra(keyword: str, meses: int):
+    def gravar(conn: sqlite3.Connection):
+        conn.execute("INSERT OR REPLACE INTO regras(keyword, meses) VALUES (?, ?)", (keyword.upper().strip(), meses))
+        conn.execute(VERSAO_UPSERT_QUERY, (REGRAS_VERSAO_KEY,))
+        _recalcular_status_da_regra(conn, keyword)
+        registrar_log(conn, "REGRA ADICIONADA/EDITADA", f"Universidade: {keyword}, Meses: {meses}")
+    executar_escrita(gravar)
+
+def delete_regra(regra_id: int, keyword: str):
+    def gravar(conn: sqlite3.Connection):
+        conn.execute("DELETE FROM regras WHERE id=?", (int(regra_id),))
+        conn.execute(VERSAO_UPSERT_QUERY, (REGRAS_VERSAO_KEY,))
+        _recalcular_status_da_regra(conn, keyword)
+        registrar_log(conn, "REGRA EXCLUÍDA", f"ID: {regra_id}, Universidade: {keyword}")
+    executar_escrita(gravar)
+
+@instrumentado
+def get_estagiarios_df() -> pd.DataFrame:
+    # Snapshot em memória: a tabela só é relida (e as datas reconvertidas) quando uma escrita incrementa a versão
+    global _snapshot_estagiarios
+    versao = get_config(DADOS_VERSAO_KEY, "0")
+    if _snapshot_estagiarios[0] != versao:
+        _snapshot_estagiarios = (versao, _carregar_estagiarios_df())
+    return _snapshot_estagiarios[1].copy()
+
+@instrumentado
+def get_estagiario_df(est_id: int) -> pd.DataFrame:
+    return _carregar_estagiarios_df("WHERE id=?", (int(est_id),))
+
+@instrumentado
+def _carregar_estagiarios_df(filtro: str = "", params: tuple = (), limite: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+    paginacao = f"LIMIT {int(limite)} OFFSET {int(offset)}" if limite is not None else ""
+    try:
+        with get_db_connection() as conn:
+            df = pd.read_sql_query(f"SELECT {ESTAGIARIOS_COLUNAS}, {', '.join(COLUNAS_STATUS)} FROM estagiarios {filtro} ORDER BY data_vencimento NULLS LAST, id {paginacao}", conn, index_col="id", params=params)
+    except (pd.io.sql.DatabaseError, ValueError):
+        return pd.DataFrame()
+
+    if df.empty: return df
+    _converter_datas(df)
+    df.reset_index(inplace=True)
+    return df
+
+def _converter_datas(df: pd.DataFrame):
+    for col in ['data_admissao', 'data_ult_renovacao', 'data_vencimento']:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+
+def iterar_estagiarios(status: Optional[list] = None, nome: str = "", tamanho_lote: int = STATUS_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    # Mesma ordem e filtros do Dashboard, lidos de um cursor em lotes: para relatórios de bases de qualquer tamanho
+    filtro, params = _filtro_estagiarios(status, nome)
+    with get_db_connection() as conn:
+        cursor = conn.execute(f"SELECT {ESTAGIARIOS_COLUNAS}, {', '.join(COLUNAS_STATUS)} FROM estagiarios {filtro} ORDER BY data_vencimento NULLS LAST, id", params)
+        colunas = [d[0] for d in cursor.description]
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote: break
+            df = pd.DataFrame([tuple(row) for row in lote], columns=colunas)
+            _converter_datas(df)
+            yield df
+
+def insert_estagiario(nome: str, universidade: str, data_adm: date, data_renov: Optional[date], obs: str, data_venc: Optional[date]):
+    query = "INSERT INTO estagiarios(nome, universidade, data_admissao, data_ult_renovacao, obs, data_vencimento, nome_normalizado, chave_identidade) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    params = (
+        nome, universidade, data_adm.isoformat(), 
+        data_renov.isoformat() if data_renov else None, 
+        obs, 
+        data_venc.isoformat() if data_venc else None,
+        normalize_text(nome),
+        chave_identidade(nome, universidade, data_adm.isoformat())
+    )
+    def gravar(conn: sqlite3.Connection):
+        est_id = conn.execute(query, params).lastrowid
+        registrar_historico(conn, "I", "WHERE id=?", (est_id,))
+        recalcular_status(conn, "WHERE id=?", (est_id,))
+        atualizar_calendario(conn, "WHERE id=?", (est_id,))
+        conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+        registrar_log(conn, "NOVO ESTAGIÁRIO", f"Nome: {nome}, Universidade: {universidade}")
+    executar_escrita(gravar)
+
+def update_estagiario(est_id: int, nome: str, universidade: str, data_adm: date, data_renov: Optional[date], obs: str, data_venc: Optional[date]):
+    query = "UPDATE estagiarios SET nome=?, universidade=?, data_admissao=?, data_ult_renovacao=?, obs=?, data_vencimento=?, nome_normalizado=?, chave_identidade=? WHERE id=?"
+    params = (
+        nome, universidade, data_adm.isoformat(), 
+        data_renov.isoformat() if data_renov else None, 
+        obs, 
+        data_venc.isoformat() if data_venc else None, 
+        normalize_text(nome),
+        chave_identidade(nome, universidade, data_adm.isoformat()),
+        est_id
+    )
+    def gravar(conn: sqlite3.Connection):
+        conn.execute(query, params)
+        registrar_historico(conn, "U", "WHERE id=?", (est_id,))
+        recalcular_status(conn, "WHERE id=?", (est_id,))
+        atualizar_calendario(conn, "WHERE id=?", (est_id,))
+        conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+        registrar_log(conn, "ESTAGIÁRIO ATUALIZADO", f"ID: {est_id}, Nome: {nome}")
+    executar_escrita(gravar)
+
+def delete_estagiario(est_id: int, nome: str):
+    def gravar(conn: sqlite3.Connection):
+        registrar_historico(conn, "D", "WHERE id=?", (int(est_id),))
+        conn.execute("DELETE FROM estagiarios WHERE id=?", (int(est_id),))
+        remover_do_calendario(conn, est_id)
+        conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+        registrar_log(conn, "ESTAGIÁRIO EXCLUÍDO", f"ID: {est_id}, Nome: {nome}")
+    executar_escrita(gravar)
+
+def normalize_text(text: str) -> str:
+    if not isinstance(text, str): return ""
+    # Texto só com ASCII não tem acentos a remover (caminho rápido da importação e da chave de identidade)
+    if text.isascii(): return text.lower()
+    return "".join(c for c in unicodedata.normalize('NFD', text.lower()) if unicodedata.category(c) != 'Mn')
+
+def chave_identidade(nome: str, universidade: str, data_admissao: Optional[str]) -> str:
+    # Nome e universidade sem acentos, maiúsculas ou espaços repetidos, mais a admissão 'AAAA-MM-DD': a mesma pessoa
+    # no mesmo contrato, seja qual for a grafia. Coluna com índice único, alvo do upsert da importação
+    return "|".join([" ".join(normalize_text(nome).split()), " ".join(normalize_text(universidade).split()), data_admissao or ""])
+
+@instrumentado
+def estagiario_existente(nome: str, universidade: str, data_adm: date, ignorar_id: Optional[int] = None) -> Optional[int]:
+    # Id de outro registro com a mesma chave de identidade (o índice único recusaria a gravação)
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT id FROM estagiarios WHERE chave_identidade=? AND id IS NOT ?",
+                           (chave_identidade(nome, universidade, data_adm.isoformat()), None if ignorar_id is None else int(ignorar_id))).fetchone()
+    return row[0] if row else None
+
+# Busca pelo início do nome, sem diferenciar acentos e maiúsculas, como faixa [termo, termo com o último caractere
+# seguinte): o SQLite percorre só esse trecho de idx_estagiarios_nome_normalizado. Um trecho do meio do nome
+# (instr/LIKE '%x%') obrigaria a ler a tabela inteira
+NOME_PREFIXO_FILTRO = "nome_normalizado >= ? AND nome_normalizado < ?"
+
+def _faixa_prefixo_nome(termo: str) -> tuple:
+    termo_normalizado = normalize_text(termo.strip())
+    return termo_normalizado, termo_normalizado[:-1] + chr(ord(termo_normalizado[-1]) + 1)
+
+@instrumentado
+def buscar_estagiarios_por_nome(termo: str, limite: int = SEARCH_PAGE_SIZE, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+    # Resolvida no SQL e paginada; o total vem do mesmo trecho do índice
+    faixa = _faixa_prefixo_nome(termo)
+    with get_db_connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM estagiarios WHERE {NOME_PREFIXO_FILTRO}", faixa).fetchone()[0]
+        df = pd.read_sql_query(
+            f"SELECT id, nome, universidade, data_admissao FROM estagiarios WHERE {NOME_PREFIXO_FILTRO} "
+            "ORDER BY data_vencimento NULLS LAST, id LIMIT ? OFFSET ?",
+            conn, params=faixa + (limite, offset))
+    df['data_admissao'] = pd.to_datetime(df['data_admissao'], errors='coerce')
+    return df, total
+
+def _filtro_estagiarios(status: Optional[list] = None, nome: str = "") -> Tuple[str, tuple]:
+    condicoes, params = [], []
+    if status:
+        condicoes.append(f"status IN ({', '.join('?' * len(status))})")
+        params.extend(status)
+    if nome.strip():
+        condicoes.append(NOME_PREFIXO_FILTRO)
+        params.extend(_faixa_prefixo_nome(nome))
+    return ("WHERE " + " AND ".join(condicoes)) if condicoes else "", tuple(params)
+
+@instrumentado
+def consultar_estagiarios(status: Optional[list] = None, nome: str = "", limite: Optional[int] = DASHBOARD_PAGE_SIZE, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+    # Filtro e paginação resolvidos no SQLite: só a página pedida é carregada, qualquer que seja o tamanho da base
+    filtro, params = _filtro_estagiarios(status, nome)
+    with get_db_connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM estagiarios {filtro}", params).fetchone()[0]
+    if total == 0: return pd.DataFrame(), 0
+    return _carregar_estagiarios_df(filtro, params, limite, offset), total
+
+@instrumentado
+def existem_estagiarios() -> bool:
+    with get_db_connection() as conn:
+        return conn.execute("SELECT EXISTS(SELECT 1 FROM estagiarios)").fetchone()[0] == 1
+
+def meses_por_universidade(universidade: str, indice_regras: Optional[Dict[str, int]] = None) -> int:
+    if not universidade: return DEFAULT_DURATION_OTHERS
+    if indice_regras is None: indice_regras = get_indice_regras()
+    return indice_regras.get(chave_universidade(universidade), DEFAULT_DURATION_OTHERS)
+
+def set_proximos_dias(proximos_dias: int):
+    # O limite de "Venc.Proximo" muda o status de toda a base
+    def gravar(conn: sqlite3.Connection):
+        conn.execute("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", ('proximos_dias', str(proximos_dias)))
+        recalcular_status(conn)
+        conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+    executar_escrita(gravar)
+
+@instrumentado
+def atualizar_status_do_dia():
+    # O status depende da data de hoje: recalcula a base uma vez por dia (o primeiro processo que perceber a virada faz o trabalho),
+    # aproveitando para arquivar os logs que saíram do período de retenção
+    global _status_calculado_em
+    hoje = date.today().isoformat()
+    if _status_calculado_em == hoje: return
+    def gravar(conn: sqlite3.Connection):
+        if reservar_tarefa_do_dia(conn, STATUS_DATA_KEY, hoje):
+            recalcular_status(conn)
+            conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+            arquivar_logs(conn)
+    if get_config(STATUS_DATA_KEY) != hoje: executar_escrita(gravar)
+    _status_calculado_em = hoje
+
+@instrumentado
+def recalcular_status_em_lotes(tamanho_lote: int = STATUS_BATCH_SIZE, progresso: Optional[Callable[[int], None]] = None) -> int:
+    # Base inteira em fatias de ids consecutivos: cada fatia é uma escrita própria na fila, então a memória fica
+    # limitada a um lote e as sessões do app continuam gravando entre uma fatia e outra
+    ultimo_id, total = 0, 0
+    while True:
+        def gravar(conn: sqlite3.Connection, inicio: int = ultimo_id) -> Tuple[Optional[int], int]:
+            fim, quantidade = conn.execute("SELECT max(id), count(*) FROM (SELECT id FROM estagiarios WHERE id > ? ORDER BY id LIMIT ?)", (inicio, tamanho_lote)).fetchone()
+            if fim is not None: recalcular_status(conn, "WHERE id > ? AND id <= ?", (inicio, fim))
+            return fim, quantidade
+        ultimo_id, quantidade = executar_escrita(gravar)
+        if ultimo_id is None: break
+        total += quantidade
+        if progresso: progresso(total)
+    def concluir(conn: sqlite3.Connection):
+        conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+        conn.execute("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", (STATUS_DATA_KEY, date.today().isoformat()))
+        registrar_log(conn, "STATUS RECALCULADO EM LOTE", f"{total} estagiários")
+    executar_escrita(concluir)
+    return total
+
+@instrumentado
+def contar_status() -> Dict[str, int]:
+    with get_db_connection() as conn:
+        return {row[0]: row[1] for row in conn.execute("SELECT status, COUNT(*) FROM estagiarios GROUP BY status")}
+
+@instrumentado
+def processar_df_para_exibicao(df: pd.DataFrame, proximos_dias: int) -> pd.DataFrame:
+    if df.empty: return df
+    df_proc = df.copy()
+    regras_meses = get_indice_regras()
+    # Os campos já vêm gravados no banco; só linhas ainda sem status calculado são processadas aqui
+    for col in COLUNAS_STATUS:
+        if col not in df_proc.columns: df_proc[col] = None
+    pendentes = df_proc['status'].isna()
+    if pendentes.any():
+        df_proc.loc[pendentes, COLUNAS_STATUS] = calcular_status(df_proc[pendentes], proximos_dias, regras_meses)
+    meses = meses_por_universidade_serie(df_proc['universidade'], regras_meses)
+    mask = (meses >= 24) & df_proc['data_ult_renovacao'].isnull()
+    df_proc['data_ult_renovacao_str'] = formatar_datas(df_proc['data_ult_renovacao']).mask(mask, "Contrato único")
+    for col in ["data_admissao", "data_vencimento"]:
+        df_proc[col] = formatar_datas(df_proc[col])
+    df_proc = df_proc.rename(columns={'id': 'ID', 'nome': 'Nome', 'universidade': 'Universidade', 'data_admissao': 'Data Admissão', 'data_ult_renovacao_str': 'Renovado em:', 'status': 'Status', 'ultimo_ano': 'Ultimo Ano?', 'proxima_renovacao': 'Proxima Renovação', 'data_vencimento': 'Termino de Contrato', 'obs': 'Observação'})
+    return df_proc
+
+# ==========================
+# Duplicatas
+# ==========================
+def agrupar_duplicatas(df: pd.DataFrame) -> Tuple[pd.DataFrame, list]:
+    # Ordena por (chave, id), O(n log n), e funde cada grupo de mesma chave no registro mais antigo, que mantém o id:
+    # nome, universidade e término vêm da versão mais recente, a renovação é a mais recente informada e as observações
+    # são as últimas não vazias. Devolve (um registro fundido por grupo, com a quantidade, e os ids a remover)
+    df = df.assign(chave_identidade=[chave_identidade(n, u, d) for n, u, d in zip(df['nome'], df['universidade'], df['data_admissao'])])
+    df = df.sort_values(['chave_identidade', 'id'])
+    df = df[df['chave_identidade'].duplicated(keep=False)]
+    grupos = df.assign(obs=df['obs'].mask(df['obs'] == "")).groupby('chave_identidade', sort=False)
+    fundidos = grupos.agg(
+        id=('id', 'first'), nome=('nome', 'last'), universidade=('universidade', 'last'), data_admissao=('data_admissao', 'first'),
+        data_ult_renovacao=('data_ult_renovacao', 'max'), obs=('obs', 'last'), data_vencimento=('data_vencimento', 'last'),
+        quantidade=('id', 'size'),
+    ).reset_index()
+    return fundidos, df['id'][~df['id'].isin(fundidos['id'])].tolist()
+
+@instrumentado
+def deduplicar_estagiarios(conn: sqlite3.Connection) -> int:
+    # Fusão dos repetidos na transação de quem chamou; os removidos ficam no histórico como exclusões e os fundidos
+    # ganham uma versão nova. Devolve quantos registros foram removidos
+    df = pd.read_sql_query("SELECT id, nome, universidade, data_admissao, data_ult_renovacao, obs, data_vencimento FROM estagiarios", conn)
+    fundidos, removidos = agrupar_duplicatas(df)
+    if not removidos: return 0
+    ids_removidos, ids_fundidos = json.dumps(removidos), json.dumps(fundidos['id'].tolist())
+    registrar_historico(conn, "D", FILTRO_IDS, (ids_removidos,))
+    conn.execute(f"DELETE FROM estagiarios {FILTRO_IDS}", (ids_removidos,))
+    conn.execute(f"DELETE FROM calendario_renovacoes {FILTRO_IDS}", (ids_removidos,))
+    conn.executemany(
+        "UPDATE estagiarios SET nome=?, universidade=?, data_ult_renovacao=?, obs=?, data_vencimento=?, nome_normalizado=?, chave_identidade=? WHERE id=?",
+        [(r.nome, r.universidade, None if pd.isna(r.data_ult_renovacao) else r.data_ult_renovacao, "" if pd.isna(r.obs) else r.obs,
+          None if pd.isna(r.data_vencimento) else r.data_vencimento, normalize_text(r.nome), r.chave_identidade, int(r.id))
+         for r in fundidos.itertuples(index=False)])
+    registrar_historico(conn, "U", FILTRO_IDS, (ids_fundidos,))
+    recalcular_status(conn, FILTRO_IDS, (ids_fundidos,))
+    atualizar_calendario(conn, FILTRO_IDS, (ids_fundidos,))
+    conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+    registrar_log(conn, "DUPLICATAS FUNDIDAS", f"{len(removidos)} registros repetidos fundidos em {len(fundidos)} estagiários")
+    return len(removidos)
@@ -0,0 +1,75 @@
+"""Histórico das versões de cada contrato (tabela só de inserções) e a base "como estava" em uma data passada."""
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Union
+
+import pandas as pd
+
+from .banco import get_config, get_db_connection
+from .configuracao import COLUNAS_STATUS, DEFAULT_PROXIMOS_DIAS, fuso_horario
+from .metricas import instrumentado
+from .status import calcular_status, ler_regras_meses
+
+# ==========================
+# Histórico de Contratos
+# ==========================
+# Só os campos do contrato: status e próxima renovação são derivados e recalculados para a data consultada
+HISTORICO_COLUNAS = ['nome', 'universidade', 'data_admissao', 'data_ult_renovacao', 'obs', 'data_vencimento']
+
+HISTORICO_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS estagiarios_history (history_id INTEGER PRIMARY KEY, id INTEGER NOT NULL, valid_from TEXT NOT NULL, operacao TEXT NOT NULL, "
+    + ", ".join(f"{col} TEXT" for col in HISTORICO_COLUNAS) + ")",
+    "CREATE INDEX IF NOT EXISTS idx_estagiarios_history_id_valid_from ON estagiarios_history(id, valid_from)",
+]
+
+# Versão idêntica à última já gravada para o mesmo id: não gera linha nova
+_SEM_MUDANCA = (
+    "EXISTS (SELECT 1 FROM estagiarios_history h WHERE h.history_id = (SELECT max(history_id) FROM estagiarios_history WHERE id = estagiarios.id) "
+    "AND h.operacao <> 'D' AND " + " AND ".join(f"h.{col} IS estagiarios.{col}" for col in HISTORICO_COLUNAS) + ")"
+)
+
+def _agora() -> str:
+    return datetime.now(fuso_horario()).strftime("%Y-%m-%d %H:%M:%S")
+
+def registrar_historico(conn: sqlite3.Connection, operacao: str, filtro: str, params: tuple = ()):
+    # Nova versão das linhas do filtro ('I' inclusão, 'U' alteração, 'D' exclusão), na transação de quem chamou.
+    # Exclusão grava só a marca e deve ser registrada antes do DELETE
+    condicao = f"{filtro} AND" if filtro else "WHERE"
+    if operacao == "D":
+        conn.execute(f"INSERT INTO estagiarios_history(id, valid_from, operacao) SELECT id, ?, 'D' FROM estagiarios {filtro}", (_agora(), *params))
+    else:
+        colunas = ", ".join(HISTORICO_COLUNAS)
+        conn.execute(
+            f"INSERT INTO estagiarios_history(id, valid_from, operacao, {colunas}) SELECT id, ?, ?, {colunas} FROM estagiarios {condicao} NOT {_SEM_MUDANCA}",
+            (_agora(), operacao, *params))
+
+def _limite(momento: Union[date, datetime]) -> str:
+    # Limite exclusivo: uma data inclui o dia inteiro, um datetime inclui o próprio segundo
+    if isinstance(momento, datetime): return (momento + timedelta(seconds=1)).strftime("%Y-%m-%d %H:%M:%S")
+    return (momento + timedelta(days=1)).isoformat()
+
+@instrumentado
+def estagiarios_em(momento: Union[date, datetime], com_status: bool = True) -> pd.DataFrame:
+    # A base inteira como estava no momento pedido, numa única consulta: a última versão de cada id até o limite sai
+    # de um percurso do índice (id, valid_from), que já contém o history_id
+    colunas = ", ".join(f"h.{col}" for col in HISTORICO_COLUNAS)
+    with get_db_connection() as conn:
+        df = pd.read_sql_query(
+            f"SELECT h.id, {colunas} FROM (SELECT id, max(history_id) AS history_id FROM estagiarios_history WHERE valid_from < ? GROUP BY id) ultima "
+            "JOIN estagiarios_history h ON h.history_id = ultima.history_id WHERE h.operacao <> 'D' ORDER BY h.data_vencimento NULLS LAST, h.id",
+            conn, params=(_limite(momento),))
+        regras_meses = ler_regras_meses(conn)
+    for col in ['data_admissao', 'data_ult_renovacao', 'data_vencimento']:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+    if com_status:
+        # Status da época, com as regras e o limite de "Venc.Proximo" atuais
+        dia = momento.date() if isinstance(momento, datetime) else momento
+        df[COLUNAS_STATUS] = calcular_status(df, int(get_config("proximos_dias", DEFAULT_PROXIMOS_DIAS)), regras_meses, dia)
+    return df
+
+@instrumentado
+def historico_estagiario(est_id: int) -> pd.DataFrame:
+    with get_db_connection() as conn:
+        return pd.read_sql_query(
+            f"SELECT valid_from, operacao, {', '.join(HISTORICO_COLUNAS)} FROM estagiarios_history WHERE id=? ORDER BY valid_from DESC, history_id DESC",
+            conn, params=(int(est_id),))
@@ -0,0 +1,171 @@
+"""Auditoria: gravação dos logs (na transação da alteração ou em lote), arquivamento mensal e exportação."""
+import atexit
+import csv
+import gzip
+import io
+import json
+import sqlite3
+import tempfile
+import threading
+from datetime import date, datetime
+from typing import IO, Iterator, Optional, Tuple
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from . import configuracao
+from .banco import enviar_escrita, get_db_connection
+from .configuracao import (
+    DB_WRITE_TIMEOUT, LOG_BUFFER_SECONDS, LOG_BUFFER_SIZE, LOG_EXPORT_BATCH_SIZE, LOG_EXPORT_COLUNAS,
+    LOG_RETENCAO_MESES, fuso_horario,
+)
+from .metricas import instrumentado
+
+# ==========================
+# Logs
+# ==========================
+LOG_INSERT_QUERY = "INSERT INTO logs (timestamp, action, details) VALUES (?, ?, ?)"
+
+def _log_params(action: str, details: str = "") -> tuple:
+    return (datetime.now(fuso_horario()).strftime("%Y-%m-%d %H:%M:%S"), action, details)
+
+def registrar_log(conn: sqlite3.Connection, action: str, details: str = ""):
+    # Auditoria na mesma transação da alteração: um único commit por ação do usuário
+    if configuracao.LOG_BUFFERED: _enfileirar_log(_log_params(action, details))
+    else: conn.execute(LOG_INSERT_QUERY, _log_params(action, details))
+
+def log_action(action: str, details: str = ""):
+    # Para entradas sem escrita associada; não espera a gravação
+    params = _log_params(action, details)
+    if configuracao.LOG_BUFFERED: _enfileirar_log(params)
+    else: enviar_escrita(lambda conn: conn.execute(LOG_INSERT_QUERY, params).rowcount)
+
+# Entradas à espera do próximo lote (LOG_BUFFERED)
+_logs_pendentes: list = []
+_logs_lock = threading.Lock()
+_logs_timer: Optional[threading.Timer] = None
+
+def _enfileirar_log(params: tuple):
+    # Modo em lote: as entradas ficam em memória e são gravadas juntas ao encher o buffer ou após LOG_BUFFER_SECONDS
+    global _logs_timer
+    with _logs_lock:
+        _logs_pendentes.append(params)
+        cheio = len(_logs_pendentes) >= LOG_BUFFER_SIZE
+        if not cheio and _logs_timer is None:
+            _logs_timer = threading.Timer(LOG_BUFFER_SECONDS, descarregar_logs)
+            _logs_timer.daemon = True
+            _logs_timer.start()
+    if cheio: descarregar_logs()
+
+def descarregar_logs(esperar: bool = False):
+    global _logs_timer
+    with _logs_lock:
+        lote = list(_logs_pendentes)
+        _logs_pendentes.clear()
+        if _logs_timer is not None:
+            _logs_timer.cancel()
+            _logs_timer = None
+    if not lote: return
+    futuro = enviar_escrita(lambda conn: conn.executemany(LOG_INSERT_QUERY, lote).rowcount)
+    if esperar: futuro.result(timeout=DB_WRITE_TIMEOUT)
+
+atexit.register(descarregar_logs, esperar=True)
+
+def arquivar_logs(conn: sqlite3.Connection, meses_retencao: int = LOG_RETENCAO_MESES) -> int:
+    # Move os logs anteriores ao período de retenção para logs_arquivo, um membro gzip por rodada (o bloco do mês só cresce)
+    corte = (date.today().replace(day=1) - relativedelta(months=meses_retencao)).isoformat()
+    meses = [row[0] for row in conn.execute("SELECT DISTINCT substr(timestamp, 1, 7) FROM logs WHERE timestamp < ?", (corte,))]
+    arquivados = 0
+    for mes in meses:
+        inicio = mes + "-01"
+        fim = min(corte, (date.fromisoformat(inicio) + relativedelta(months=1)).isoformat())
+        buffer = io.BytesIO()
+        quantidade = 0
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as saida:
+            cursor = conn.execute("SELECT timestamp, action, details FROM logs WHERE timestamp >= ? AND timestamp < ? ORDER BY id", (inicio, fim))
+            while True:
+                lote = cursor.fetchmany(LOG_EXPORT_BATCH_SIZE)
+                if not lote: break
+                saida.write("".join(json.dumps(dict(zip(LOG_EXPORT_COLUNAS, tuple(row))), ensure_ascii=False) + "\n" for row in lote).encode('utf-8'))
+                quantidade += len(lote)
+        if quantidade == 0: continue
+        anterior = conn.execute("SELECT quantidade, dados FROM logs_arquivo WHERE mes=?", (mes,)).fetchone()
+        dados = (bytes(anterior['dados']) if anterior else b"") + buffer.getvalue()
+        conn.execute("INSERT OR REPLACE INTO logs_arquivo(mes, quantidade, dados) VALUES (?, ?, ?)", (mes, quantidade + (anterior['quantidade'] if anterior else 0), dados))
+        conn.execute("DELETE FROM logs WHERE timestamp >= ? AND timestamp < ?", (inicio, fim))
+        arquivados += quantidade
+    return arquivados
+
+@instrumentado
+def listar_logs_arquivados() -> pd.DataFrame:
+    with get_db_connection() as conn:
+        return pd.read_sql_query("SELECT mes, quantidade, length(dados) AS bytes FROM logs_arquivo ORDER BY mes DESC", conn)
+
+def baixar_logs_arquivados(mes: str) -> bytes:
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT dados FROM logs_arquivo WHERE mes=?", (mes,)).fetchone()
+    return bytes(row['dados']) if row else b""
+
+def _faixa_timestamp(start_date: date, end_date: date) -> Tuple[str, str]:
+    # Faixa semiaberta [início, fim + 1 dia) equivalente a date(timestamp) BETWEEN início AND fim, mas usando o índice
+    return start_date.isoformat(), (end_date + relativedelta(days=1)).isoformat()
+
+def _filtro_logs(start_date: Optional[date], end_date: Optional[date]) -> Tuple[str, tuple]:
+    if start_date and end_date: return "WHERE timestamp >= ? AND timestamp < ?", _faixa_timestamp(start_date, end_date)
+    return "", ()
+
+@instrumentado
+def list_logs_df(start_date: Optional[date] = None, end_date: Optional[date] = None) -> pd.DataFrame:
+    descarregar_logs(esperar=True)
+    filtro, params = _filtro_logs(start_date, end_date)
+    with get_db_connection() as conn:
+        return pd.read_sql_query(f"SELECT timestamp, action, details FROM logs {filtro} ORDER BY id DESC LIMIT 50", conn, params=params)
+
+def _iterar_logs(start_date: Optional[date], end_date: Optional[date], tamanho_lote: int) -> Iterator[list]:
+    filtro, params = _filtro_logs(start_date, end_date)
+    with get_db_connection() as conn:
+        cursor = conn.execute(f"SELECT timestamp, action, details FROM logs {filtro} ORDER BY id ASC", params)
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote: break
+            yield [tuple(row) for row in lote]
+
+def _larguras_logs_txt(start_date: Optional[date], end_date: Optional[date]) -> Optional[list]:
+    # Primeira passada, só com agregados no SQL, para reproduzir o alinhamento do DataFrame.to_string sem carregar os logs
+    filtro, params = _filtro_logs(start_date, end_date)
+    with get_db_connection() as conn:
+        row = conn.execute(f"SELECT COUNT(*), max(length(timestamp)), max(length(action)), max(length(coalesce(details, ''))) FROM logs {filtro}", params).fetchone()
+    if row[0] == 0: return None
+    return [max(len(nome), largura) for nome, largura in zip(LOG_EXPORT_COLUNAS, tuple(row)[1:])]
+
+def gerar_exportacao_logs(start_date: Optional[date] = None, end_date: Optional[date] = None, formato: str = "txt", tamanho_lote: int = LOG_EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    # Gera o arquivo em blocos a partir de um cursor: a memória usada não depende do tamanho da tabela de logs
+    descarregar_logs(esperar=True)
+    if formato == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(LOG_EXPORT_COLUNAS)
+        for lote in _iterar_logs(start_date, end_date, tamanho_lote):
+            writer.writerows(lote)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0); buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+    elif formato == "ndjson":
+        for lote in _iterar_logs(start_date, end_date, tamanho_lote):
+            yield "".join(json.dumps(dict(zip(LOG_EXPORT_COLUNAS, row)), ensure_ascii=False) + "\n" for row in lote).encode('utf-8')
+    else:
+        larguras = _larguras_logs_txt(start_date, end_date)
+        if larguras is None:
+            yield f"Empty DataFrame\nColumns: [{', '.join(LOG_EXPORT_COLUNAS)}]\nIndex: []".encode('utf-8')
+            return
+        yield " ".join(nome.rjust(l) for nome, l in zip(LOG_EXPORT_COLUNAS, larguras)).encode('utf-8')
+        for lote in _iterar_logs(start_date, end_date, tamanho_lote):
+            yield "".join("\n" + " ".join(("" if v is None else str(v)).rjust(l) for v, l in zip(row, larguras)) for row in lote).encode('utf-8')
+
+@instrumentado
+def exportar_logs_arquivo(start_date: Optional[date] = None, end_date: Optional[date] = None, formato: str = "txt") -> IO[bytes]:
+    arquivo = tempfile.TemporaryFile()
+    for bloco in gerar_exportacao_logs(start_date, end_date, formato):
+        arquivo.write(bloco)
+    arquivo.seek(0)
+    return arquivo
@@ -0,0 +1,198 @@
+"""Instrumentação: tempo por função e por consulta SQL, por rerun do Streamlit e acumulado no processo."""
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple
+
+from .configuracao import PERF_CONSULTAS_POR_RERUN, PERF_LOG_ESTRUTURADO, PERF_SQL_MAX_CHARS, PERF_TOP_CONSULTAS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ==========================
+# Instrumentação (tempo e consultas por rerun)
+# ==========================
+class MedicaoRerun:
+    def __init__(self):
+        # A thread de escrita também registra nesta medição (tarefas enviadas pelo rerun), então as somas têm lock
+        self.lock = threading.Lock()
+        self.inicio = time.perf_counter()
+        self.pagina = ""
+        self.funcoes: Dict[str, list] = {}
+        self.consultas: list = []
+        self.total_consultas = 0
+        self.segundos_consultas = 0.0
+        self.resumo: Optional[Dict[str, Any]] = None
+
+class RegistroMetricas:
+    """Totais por função e por consulta desde o início do processo; como todo estado de módulo do pacote, sobrevive aos reruns."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.funcoes: Dict[str, list] = {}
+        self.consultas: Dict[str, list] = {}
+        self.reruns = [0, 0.0]
+
+_metricas = RegistroMetricas()
+_logger_performance = logging.getLogger("estagiarios.performance")
+
+def medicao_atual() -> Optional[MedicaoRerun]:
+    return getattr(_metricas.local, "medicao", None)
+
+@contextmanager
+def usar_medicao(medicao: Optional[MedicaoRerun]) -> Iterator[None]:
+    # Registra nesta thread o que for medido no bloco na medição de outra (o rerun que enviou a tarefa de escrita)
+    anterior = medicao_atual()
+    _metricas.local.medicao = medicao
+    try:
+        yield
+    finally:
+        _metricas.local.medicao = anterior
+
+def _acumular(destino: Dict[str, list], chave: str, segundos: float):
+    # [chamadas, segundos acumulados, maior tempo]
+    atual = destino.get(chave)
+    if atual is None: destino[chave] = [1, segundos, segundos]
+    else:
+        atual[0] += 1
+        atual[1] += segundos
+        if segundos > atual[2]: atual[2] = segundos
+
+def registrar_tempo(nome: str, segundos: float):
+    medicao = medicao_atual()
+    if medicao is not None:
+        with medicao.lock:
+            _acumular(medicao.funcoes, nome, segundos)
+    with _metricas.lock:
+        _acumular(_metricas.funcoes, nome, segundos)
+
+def registrar_consulta(sql: str, segundos: float):
+    sql = " ".join(sql.split())[:PERF_SQL_MAX_CHARS]
+    medicao = medicao_atual()
+    if medicao is not None:
+        with medicao.lock:
+            medicao.total_consultas += 1
+            medicao.segundos_consultas += segundos
+            if len(medicao.consultas) < PERF_CONSULTAS_POR_RERUN: medicao.consultas.append((segundos, sql))
+    with _metricas.lock:
+        _acumular(_metricas.consultas, sql, segundos)
+
+def instrumentado(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            registrar_tempo(func.__name__, time.perf_counter() - inicio)
+    return wrapper
+
+@contextmanager
+def etapa(nome: str) -> Iterator[None]:
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_tempo(nome, time.perf_counter() - inicio)
+
+class CursorInstrumentado(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            registrar_consulta(sql, time.perf_counter() - inicio)
+
+    def executemany(self, sql, seq_of_parameters):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            registrar_consulta(sql, time.perf_counter() - inicio)
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    # Toda consulta local passa pelo CursorInstrumentado: conn.execute, conn.executemany e pd.read_sql_query (via cursor())
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+@contextmanager
+def medicao_do_rerun() -> Iterator[MedicaoRerun]:
+    medicao = MedicaoRerun()
+    _metricas.local.medicao = medicao
+    try:
+        yield medicao
+    finally:
+        _metricas.local.medicao = None
+        # O resumo fica na própria medição; guardá-lo na sessão é papel da interface
+        with medicao.lock:
+            medicao.resumo = resumir_medicao(medicao, time.perf_counter() - medicao.inicio)
+        with _metricas.lock:
+            _metricas.reruns[0] += 1
+            _metricas.reruns[1] += medicao.resumo["segundos"]
+        if PERF_LOG_ESTRUTURADO: _logger_performance.info(json.dumps(medicao.resumo, ensure_ascii=False))
+
+def resumir_medicao(medicao: MedicaoRerun, segundos: float) -> Dict[str, Any]:
+    return {
+        "pagina": medicao.pagina, "segundos": round(segundos, 6),
+        "consultas": medicao.total_consultas, "segundos_consultas": round(medicao.segundos_consultas, 6),
+        "funcoes": {nome: {"chamadas": c, "segundos": round(t, 6)} for nome, (c, t, _) in sorted(medicao.funcoes.items(), key=lambda item: -item[1][1])},
+        "consultas_lentas": [{"segundos": round(t, 6), "sql": sql} for t, sql in sorted(medicao.consultas, reverse=True)[:PERF_TOP_CONSULTAS]],
+    }
+
+def metricas_processo() -> Tuple["pd.DataFrame", "pd.DataFrame", Tuple[int, float]]:
+    import pandas as pd
+    with _metricas.lock:
+        funcoes = [(nome, c, t, t / c, m) for nome, (c, t, m) in _metricas.funcoes.items()]
+        consultas = [(sql, c, t, t / c, m) for sql, (c, t, m) in _metricas.consultas.items()]
+        reruns = tuple(_metricas.reruns)
+    colunas = ["chamadas", "total_ms", "media_ms", "max_ms"]
+    df_funcoes = pd.DataFrame(funcoes, columns=["funcao", *colunas])
+    df_consultas = pd.DataFrame(consultas, columns=["sql", *colunas])
+    for df in (df_funcoes, df_consultas):
+        for col in colunas[1:]: df[col] = (df[col] * 1000).round(2)
+    return df_funcoes.sort_values("total_ms", ascending=False), df_consultas.sort_values("total_ms", ascending=False), reruns
+
+def zerar_metricas():
+    with _metricas.lock:
+        _metricas.funcoes.clear()
+        _metricas.consultas.clear()
+        _metricas.reruns[:] = [0, 0.0]
+
+def _rotulo_prometheus(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def metricas_prometheus() -> str:
+    df_funcoes, df_consultas, (reruns, segundos_reruns) = metricas_processo()
+    from .banco import get_pool  # banco depende deste módulo
+    stats = get_pool().estatisticas()
+    linhas = [
+        "# HELP estagiarios_reruns_total Reruns do Streamlit medidos.", "# TYPE estagiarios_reruns_total counter",
+        f"estagiarios_reruns_total {reruns}",
+        "# HELP estagiarios_rerun_segundos_total Tempo somado dos reruns.", "# TYPE estagiarios_rerun_segundos_total counter",
+        f"estagiarios_rerun_segundos_total {segundos_reruns:.6f}",
+        "# HELP estagiarios_conexoes_abertas Conexões SQLite abertas no pool.", "# TYPE estagiarios_conexoes_abertas gauge",
+        f"estagiarios_conexoes_abertas {stats['abertas']}",
+        "# HELP estagiarios_escritas_total Escritas gravadas pela fila de escrita.", "# TYPE estagiarios_escritas_total counter",
+        f"estagiarios_escritas_total {stats['escritas']}",
+        "# HELP estagiarios_commits_total Commits feitos pela fila de escrita.", "# TYPE estagiarios_commits_total counter",
+        f"estagiarios_commits_total {stats['commits']}",
+        "# HELP estagiarios_config_leituras_total Releituras da tabela config após mudanças no banco.", "# TYPE estagiarios_config_leituras_total counter",
+        f"estagiarios_config_leituras_total {stats['leituras_config']}",
+    ]
+    for metrica, df, rotulo in (("funcao", df_funcoes, "funcao"), ("consulta", df_consultas.head(PERF_TOP_CONSULTAS), "sql")):
+        linhas += [f"# HELP estagiarios_{metrica}_chamadas_total Chamadas por {rotulo}.", f"# TYPE estagiarios_{metrica}_chamadas_total counter"]
+        linhas += [f'estagiarios_{metrica}_chamadas_total{{{rotulo}="{_rotulo_prometheus(nome)}"}} {c}' for nome, c in zip(df[rotulo], df["chamadas"])]
+        linhas += [f"# HELP estagiarios_{metrica}_segundos_total Tempo somado por {rotulo}.", f"# TYPE estagiarios_{metrica}_segundos_total counter"]
+        linhas += [f'estagiarios_{metrica}_segundos_total{{{rotulo}="{_rotulo_prometheus(nome)}"}} {ms / 1000:.6f}' for nome, ms in zip(df[rotulo], df["total_ms"])]
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,165 @@
+"""Criação do banco e migrações de esquema, aplicadas uma única vez por versão."""
+import sqlite3
+import threading
+from datetime import date
+
+from .banco import ALTERACOES_SCHEMA, ALTERACOES_TABELA, ALTERACOES_TRIGGERS, execute_write_query, get_config, get_pool
+from .calendario import CALENDARIO_SCHEMA, atualizar_calendario
+from .configuracao import COLUNAS_STATUS, DEFAULT_PROXIMOS_DIAS, SCHEMA_VERSION_KEY, STATUS_DATA_KEY
+from .dados import chave_identidade, deduplicar_estagiarios, normalize_text
+from .historico import HISTORICO_SCHEMA, registrar_historico
+from .metricas import instrumentado
+from .status import recalcular_status
+
+# ==========================
+# Inicialização do Banco
+# ==========================
+@instrumentado
+def init_db():
+    # Banco já na última versão do esquema: nada a criar nem semear, então nenhuma escrita é feita
+    if versao_schema() >= MIGRACOES[-1][0]: return
+    execute_write_query("CREATE TABLE IF NOT EXISTS estagiarios (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL, universidade TEXT NOT NULL, data_admissao TEXT NOT NULL, data_ult_renovacao TEXT, obs TEXT, data_vencimento TEXT)")
+    execute_write_query("CREATE TABLE IF NOT EXISTS regras (id INTEGER PRIMARY KEY, keyword TEXT UNIQUE NOT NULL, meses INTEGER NOT NULL)")
+    execute_write_query("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
+    execute_write_query("CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, action TEXT NOT NULL, details TEXT)")
+    aplicar_migracoes()
+    execute_write_query("INSERT OR IGNORE INTO config(key, value) VALUES(?, ?)", ('proximos_dias', str(DEFAULT_PROXIMOS_DIAS)))
+    execute_write_query("INSERT OR IGNORE INTO config(key, value) VALUES(?, ?)", ('admin_password', '123456'))
+
+_bancos_inicializados: set = set()
+_inicializacao_lock = threading.Lock()
+
+def init_db_uma_vez(db_file: str):
+    # Executado uma vez por processo (e por arquivo de banco), não a cada rerun do Streamlit
+    with _inicializacao_lock:
+        if db_file in _bancos_inicializados: return
+        init_db()
+        _bancos_inicializados.add(db_file)
+
+# ==========================
+# Migrações de Esquema
+# ==========================
+def _migracao_busca_por_nome(conn: sqlite3.Connection):
+    # Coluna com o nome sem acentos/minúsculo, indexada, usada pela busca do Cadastro
+    colunas = {row['name'] for row in conn.execute("PRAGMA table_info(estagiarios)")}
+    if 'nome_normalizado' not in colunas:
+        conn.execute("ALTER TABLE estagiarios ADD COLUMN nome_normalizado TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estagiarios_nome_normalizado ON estagiarios(nome_normalizado)")
+    pendentes = conn.execute("SELECT id, nome FROM estagiarios WHERE nome_normalizado IS NULL").fetchall()
+    conn.executemany("UPDATE estagiarios SET nome_normalizado=? WHERE id=?", [(normalize_text(row['nome']), row['id']) for row in pendentes])
+
+def _migracao_datas_iso(conn: sqlite3.Connection):
+    # Datas sempre como 'AAAA-MM-DD' para que ORDER BY e filtros por faixa funcionem direto no SQL
+    for col in ['data_admissao', 'data_ult_renovacao', 'data_vencimento']:
+        conn.execute(f"UPDATE estagiarios SET {col} = date({col}) WHERE {col} IS NOT NULL AND date({col}) IS NOT NULL AND {col} <> date({col})")
+    conn.execute("UPDATE logs SET timestamp = datetime(timestamp) WHERE datetime(timestamp) IS NOT NULL AND timestamp <> datetime(timestamp)")
+
+def _migracao_indices(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estagiarios_data_vencimento ON estagiarios(data_vencimento)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estagiarios_universidade ON estagiarios(universidade)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)")
+
+def _migracao_status_precalculado(conn: sqlite3.Connection):
+    # Status, próxima renovação e "último ano" passam a ser gravados junto com o registro
+    colunas = {row['name'] for row in conn.execute("PRAGMA table_info(estagiarios)")}
+    for col in COLUNAS_STATUS:
+        if col not in colunas:
+            conn.execute(f"ALTER TABLE estagiarios ADD COLUMN {col} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estagiarios_status ON estagiarios(status)")
+    recalcular_status(conn)
+    conn.execute("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", (STATUS_DATA_KEY, date.today().isoformat()))
+
+def _migracao_logs_arquivo(conn: sqlite3.Connection):
+    # Logs antigos saem da tabela viva e ficam num bloco NDJSON compactado (gzip) por mês
+    conn.execute("CREATE TABLE IF NOT EXISTS logs_arquivo (mes TEXT PRIMARY KEY, quantidade INTEGER NOT NULL, dados BLOB NOT NULL)")
+
+def _migracao_historico(conn: sqlite3.Connection):
+    # Versões dos contratos (só inserções), semeadas com a base atual: o histórico começa nesta migração
+    for sql in HISTORICO_SCHEMA:
+        conn.execute(sql)
+    registrar_historico(conn, "I", "")
+
+def _migracao_calendario(conn: sqlite3.Connection):
+    # Eventos de renovação e término de cada contrato, mantidos a cada escrita a partir daqui
+    for sql in CALENDARIO_SCHEMA:
+        conn.execute(sql)
+    atualizar_calendario(conn)
+
+def _migracao_identidade(conn: sqlite3.Connection):
+    # Chave de identidade (nome, universidade e admissão normalizados) com índice único: os repetidos que já existem
+    # são fundidos antes, e daqui em diante a importação atualiza em vez de duplicar
+    colunas = {row['name'] for row in conn.execute("PRAGMA table_info(estagiarios)")}
+    if 'chave_identidade' not in colunas:
+        conn.execute("ALTER TABLE estagiarios ADD COLUMN chave_identidade TEXT")
+    pendentes = conn.execute("SELECT id, nome, universidade, data_admissao FROM estagiarios WHERE chave_identidade IS NULL").fetchall()
+    conn.executemany("UPDATE estagiarios SET chave_identidade=? WHERE id=?",
+                     [(chave_identidade(row['nome'], row['universidade'], row['data_admissao']), row['id']) for row in pendentes])
+    deduplicar_estagiarios(conn)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_estagiarios_chave_identidade ON estagiarios(chave_identidade)")
+
+def _migracao_diario_alteracoes(conn: sqlite3.Connection):
+    # Ids alterados numerados por triggers: a réplica libsql copia só os estagiários (e calendários) que mudaram.
+    # Começa vazio; a réplica faz uma última cópia inteira e segue pelo diário
+    for sql in ALTERACOES_SCHEMA:
+        conn.execute(sql)
+
+def _migracao_diario_so_na_replica(conn: sqlite3.Connection):
+    # Os triggers do diário passam a ser criados pelo backend de réplica, no primário (instalar_diario): no banco
+    # local ninguém lê o diário e ele só crescia. O primário de uma réplica os recebe de volta na sincronização
+    # seguinte, com uma cópia inteira das tabelas acompanhadas
+    for nome in ALTERACOES_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+    conn.execute(f"DELETE FROM {ALTERACOES_TABELA}")
+
+def _migracao_ids_sem_reuso(conn: sqlite3.Connection):
+    # Sem AUTOINCREMENT o SQLite reaproveita o maior id depois de excluí-lo, e o novo estagiário herdaria o histórico
+    # (e as marcas no diário) do excluído. A tabela é refeita com AUTOINCREMENT a partir do próprio CREATE, com as
+    # colunas das migrações anteriores, e índices e triggers voltam como estavam
+    tabela = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'estagiarios'").fetchone()[0]
+    if "AUTOINCREMENT" not in tabela.upper():
+        dependentes = [row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE tbl_name = 'estagiarios' AND type IN ('index', 'trigger') AND sql IS NOT NULL")]
+        colunas = ", ".join(row['name'] for row in conn.execute("PRAGMA table_info(estagiarios)"))
+        conn.execute(tabela.replace("CREATE TABLE estagiarios", "CREATE TABLE estagiarios_nova", 1).replace("id INTEGER PRIMARY KEY", "id INTEGER PRIMARY KEY AUTOINCREMENT", 1))
+        conn.execute(f"INSERT INTO estagiarios_nova({colunas}) SELECT {colunas} FROM estagiarios")
+        conn.execute("DROP TABLE estagiarios")
+        conn.execute("ALTER TABLE estagiarios_nova RENAME TO estagiarios")
+        for sql in dependentes:
+            conn.execute(sql)
+    # Ids já excluídos só aparecem no histórico: a sequência parte do maior id que já existiu
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'estagiarios'")
+    conn.execute("INSERT INTO sqlite_sequence(name, seq) SELECT 'estagiarios', max((SELECT coalesce(max(id), 0) FROM estagiarios), "
+                 "(SELECT coalesce(max(id), 0) FROM estagiarios_history))")
+
+MIGRACOES = [
+    (1, _migracao_busca_por_nome),
+    (2, _migracao_datas_iso),
+    (3, _migracao_indices),
+    (4, _migracao_status_precalculado),
+    (5, _migracao_logs_arquivo),
+    (6, _migracao_historico),
+    (7, _migracao_calendario),
+    (8, _migracao_identidade),
+    (9, _migracao_diario_alteracoes),
+    (10, _migracao_diario_so_na_replica),
+    (11, _migracao_ids_sem_reuso),
+]
+
+def versao_schema() -> int:
+    try:
+        return int(get_config(SCHEMA_VERSION_KEY, "0"))
+    except sqlite3.OperationalError:
+        return 0
+
+def aplicar_migracoes():
+    # Cada migração roda uma única vez, em sua própria transação, e registra a versão em config. Vários processos
+    # podem subir juntos: BEGIN IMMEDIATE pega a trava de escrita antes de ler a versão, então quem chega depois
+    # espera, relê a versão já gravada e pula a migração (com BEGIN simples, a leitura seguida de escrita falharia
+    # com "database is locked" e, na volta, repetiria o ALTER TABLE de outro processo)
+    if versao_schema() >= MIGRACOES[-1][0]: return
+    for versao, migracao in MIGRACOES:
+        with get_pool().escrita() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM config WHERE key=?", (SCHEMA_VERSION_KEY,)).fetchone()
+            if versao <= int(row[0] if row else 0): continue
+            migracao(conn)
+            conn.execute("INSERT OR REPLACE INTO config(key, value) VALUES(?, ?)", (SCHEMA_VERSION_KEY, str(versao)))
@@ -0,0 +1,319 @@
+"""Exportação (Excel, CSV, Parquet) e importação validada de planilhas.
+
+openpyxl só é importado dentro de _gravar_excel e _blocos_xlsx.
+"""
+import io
+import json
+import sqlite3
+from concurrent.futures import Future
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from .banco import VERSAO_UPSERT_QUERY, aguardar_escrita, enviar_escrita, executar_escrita, get_config, get_pool
+from .calendario import atualizar_calendario
+from .configuracao import (
+    COLUNAS_EXIBICAO, COLUNAS_STATUS, DADOS_VERSAO_KEY, DEFAULT_PROXIMOS_DIAS, IMPORT_BATCH_SIZE,
+    IMPORT_CHUNK_SIZE, STATUS_BATCH_SIZE, STATUS_RELATORIO,
+)
+from .dados import FILTRO_IDS, chave_identidade, get_estagiarios_df, iterar_estagiarios, normalize_text, processar_df_para_exibicao
+from .historico import registrar_historico
+from .logs import registrar_log
+from .metricas import instrumentado
+from .status import recalcular_status, somar_meses
+
+# Arquivos já gerados, por (versão dos dados, formato)
+_exportacoes_em_cache: Dict[Tuple[str, str], bytes] = {}
+
+# ==========================
+# Exportação
+# ==========================
+def sem_colunas_status(df: pd.DataFrame) -> pd.DataFrame:
+    return df.drop(columns=COLUNAS_STATUS, errors='ignore')
+
+def _gravar_excel(destino: Union[str, IO[bytes]], colunas: list, lotes: Iterable[pd.DataFrame]):
+    # Workbook em modo write_only: as linhas são gravadas em fluxo, sem montar a planilha inteira em memória
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Estagiarios')
+    cabecalho = []
+    for col in colunas:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.font = Font(bold=True)
+        cabecalho.append(cell)
+    ws.append(cabecalho)
+    for df in lotes:
+        valores = df[colunas].astype(object).where(df[colunas].notna(), None)
+        for row in valores.itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(destino)
+
+@instrumentado
+def exportar_para_excel_bytes(df: pd.DataFrame) -> bytes:
+    output = io.BytesIO()
+    _gravar_excel(output, list(df.columns), [df])
+    return output.getvalue()
+
+@instrumentado
+def exportar_para_csv_bytes(df: pd.DataFrame) -> bytes:
+    # BOM UTF-8 para o Excel reconhecer os acentos ao abrir o CSV
+    return df.to_csv(index=False).encode('utf-8-sig')
+
+@instrumentado
+def exportar_para_parquet_bytes(df: pd.DataFrame) -> bytes:
+    output = io.BytesIO()
+    df.to_parquet(output, index=False)
+    return output.getvalue()
+
+EXPORT_FORMATOS = {
+    "xlsx": ("Excel (.xlsx)", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", exportar_para_excel_bytes),
+    "csv": ("CSV (.csv)", "text/csv", exportar_para_csv_bytes),
+    "parquet": ("Parquet (.parquet)", "application/vnd.apache.parquet", exportar_para_parquet_bytes),
+}
+
+@instrumentado
+def exportar_base_completa(formato: str = "xlsx") -> bytes:
+    # Gerado só quando alguém pede o arquivo e reaproveitado enquanto a versão dos dados não mudar
+    global _exportacoes_em_cache
+    versao = get_config(DADOS_VERSAO_KEY, "0")
+    chave = (versao, formato)
+    if chave not in _exportacoes_em_cache:
+        conteudo = EXPORT_FORMATOS[formato][2](sem_colunas_status(get_estagiarios_df()))
+        _exportacoes_em_cache = {k: v for k, v in _exportacoes_em_cache.items() if k[0] == versao}
+        _exportacoes_em_cache[chave] = conteudo
+    return _exportacoes_em_cache[chave]
+
+def _gravar_em_lotes(destino: str, formato: str, colunas: list, lotes: Iterable[pd.DataFrame]):
+    # Cada lote vai direto para o arquivo: CSV anexado (com BOM, como exportar_para_csv_bytes) ou xlsx em modo write_only
+    if formato != "csv": return _gravar_excel(destino, colunas, lotes)
+    with open(destino, "w", newline="", encoding="utf-8-sig") as arquivo:
+        pd.DataFrame(columns=colunas).to_csv(arquivo, index=False)
+        for df in lotes: df[colunas].to_csv(arquivo, header=False, index=False)
+
+@instrumentado
+def gerar_relatorio_vencimentos(destino: str, formato: str = "xlsx", status: tuple = STATUS_RELATORIO, tamanho_lote: int = STATUS_BATCH_SIZE) -> Dict[str, int]:
+    # Contratos "Vencido"/"Venc.Proximo" com as mesmas colunas do Dashboard, gerados lote a lote; devolve a contagem por status
+    proximos_dias = int(get_config("proximos_dias", DEFAULT_PROXIMOS_DIAS))
+    contagem = {s: 0 for s in status}
+    def lotes() -> Iterator[pd.DataFrame]:
+        for df in iterar_estagiarios(list(status), tamanho_lote=tamanho_lote):
+            df_view = processar_df_para_exibicao(df, proximos_dias)
+            for s, quantidade in df_view['Status'].value_counts().items(): contagem[s] = contagem.get(s, 0) + int(quantidade)
+            yield df_view
+    _gravar_em_lotes(destino, formato, COLUNAS_EXIBICAO, lotes())
+    return contagem
+
+# ==========================
+# Importação
+# ==========================
+IMPORT_COLUNAS_OBRIGATORIAS = ['nome', 'universidade', 'data_admissao']
+
+class ErroImportacao(RuntimeError):
+    """Importação interrompida; ``importados`` diz quantas linhas de blocos anteriores já tinham sido gravadas."""
+
+    def __init__(self, mensagem: str, importados: int = 0):
+        super().__init__(mensagem)
+        self.importados = importados
+
+def _blocos_xlsx(arquivo: IO[bytes], tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    # openpyxl em modo read_only: as linhas saem em fluxo do XML da planilha, sem montar o workbook em memória.
+    # Como o pd.read_excel, a primeira linha é o cabeçalho; linhas totalmente vazias são ignoradas
+    from openpyxl import load_workbook
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = wb.active.iter_rows(values_only=True)
+        cabecalho = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(next(linhas, ()))]
+        largura, inicio, lote = len(cabecalho), 0, []
+        for linha in linhas:
+            if all(v is None for v in linha): continue
+            lote.append(linha[:largura] + (None,) * (largura - len(linha)))
+            if len(lote) == tamanho_lote:
+                yield pd.DataFrame(lote, columns=cabecalho, index=range(inicio, inicio + len(lote)))
+                inicio, lote = inicio + len(lote), []
+        if lote or not inicio:
+            yield pd.DataFrame(lote, columns=cabecalho, index=range(inicio, inicio + len(lote)))
+    finally:
+        wb.close()
+
+def _separador_csv(arquivo: IO[bytes]) -> str:
+    # CSV salvo pelo Excel em português usa ";"; o exportado pelo app usa ","
+    cabecalho = arquivo.readline().decode('utf-8-sig', errors='ignore')
+    arquivo.seek(0)
+    return ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+
+def ler_planilha_em_blocos(arquivo: IO[bytes], nome_arquivo: str, tamanho_lote: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    # CSV é o caminho rápido (leitor em C do pandas, tudo como texto); .xlsx passa pelo openpyxl.
+    # O índice numera as linhas de dados do arquivo, contínuo entre os blocos
+    if nome_arquivo.lower().endswith('.csv'):
+        return pd.read_csv(arquivo, sep=_separador_csv(arquivo), dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=tamanho_lote)
+    return _blocos_xlsx(arquivo, tamanho_lote)
+
+def _texto_coluna(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns: return pd.Series("", index=df.index)
+    valores = df[col].astype(object)
+    return valores.where(valores.notna(), "").astype(str).str.strip().str.upper()
+
+# Datas digitadas no padrão brasileiro, dia primeiro: 03/04/2024 é 3 de abril. ISO (o CSV exportado pelo app e as
+# células de data do xlsx) sai antes, num passe vetorizado: o parser flexível com dayfirst leria 2024-04-03 10:00
+# como 4 de março
+IMPORT_FORMATOS_DATA = ['ISO8601', '%d/%m/%Y']
+
+def _data_coluna(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns: return pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    if pd.api.types.is_datetime64_any_dtype(df[col]): return df[col].dt.normalize()
+    valores = df[col].astype(object)
+    informado = valores.notna() & (valores != "")
+    datas = pd.to_datetime(valores, errors='coerce', format=IMPORT_FORMATOS_DATA[0])
+    for formato in IMPORT_FORMATOS_DATA[1:] + ['mixed']:
+        faltando = informado & datas.isna()
+        if not faltando.any(): break
+        # O que sobra no fim (dd.mm.aaaa, dd/mm/aaaa com hora) vai ao parser flexível, ainda com o dia primeiro
+        extras = {'dayfirst': True} if formato == 'mixed' else {}
+        datas[faltando] = pd.to_datetime(valores[faltando], errors='coerce', format=formato, **extras)
+    return datas.dt.normalize()
+
+@instrumentado
+def validar_importacao(df_import: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # Valida e converte a planilha inteira por coluna; devolve (linhas válidas normalizadas, linhas rejeitadas com motivo)
+    df_validos = pd.DataFrame({
+        'nome': _texto_coluna(df_import, 'nome'),
+        'universidade': _texto_coluna(df_import, 'universidade'),
+        'data_admissao': _data_coluna(df_import, 'data_admissao'),
+        'data_ult_renovacao': _data_coluna(df_import, 'data_ult_renovacao'),
+        'obs': _texto_coluna(df_import, 'obs'),
+    })
+    renov_informada = _texto_coluna(df_import, 'data_ult_renovacao') != ""
+    erros = {
+        "nome vazio": df_validos['nome'] == "",
+        "universidade vazia": df_validos['universidade'] == "",
+        "data_admissao inválida": df_validos['data_admissao'].isna(),
+        "data_ult_renovacao inválida": df_validos['data_ult_renovacao'].isna() & renov_informada,
+    }
+    motivo = pd.Series("", index=df_import.index)
+    for descricao, mask in erros.items():
+        motivo = motivo.mask(mask, motivo + descricao + "; ")
+    rejeitado = motivo != ""
+    df_rejeitados = df_import[rejeitado].assign(motivo_rejeicao=motivo[rejeitado].str.rstrip("; "))
+    df_validos = df_validos[~rejeitado].assign(data_vencimento=lambda d: somar_meses(d['data_admissao'], 24))
+    return df_validos, df_rejeitados
+
+# Quem já está cadastrado (mesma chave de identidade) é atualizado: uma renovação mais antiga ou observação vazia
+# na planilha não apaga a do banco
+IMPORT_UPSERT_QUERY = (
+    "INSERT INTO estagiarios(nome, universidade, data_admissao, data_ult_renovacao, obs, data_vencimento, nome_normalizado, chave_identidade) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(chave_identidade) DO UPDATE SET nome=excluded.nome, universidade=excluded.universidade, "
+    "data_ult_renovacao=CASE WHEN excluded.data_ult_renovacao > coalesce(data_ult_renovacao, '') THEN excluded.data_ult_renovacao ELSE data_ult_renovacao END, "
+    "obs=CASE WHEN excluded.obs <> '' THEN excluded.obs ELSE obs END, data_vencimento=excluded.data_vencimento, nome_normalizado=excluded.nome_normalizado"
+)
+
+def _iso_ou_none(datas: pd.Series) -> list:
+    return [d if isinstance(d, str) else None for d in datas.dt.strftime('%Y-%m-%d')]
+
+def _gravar_importados(conn: sqlite3.Connection, df_validos: pd.DataFrame, progresso=None, tamanho_lote: int = IMPORT_BATCH_SIZE) -> Tuple[int, int]:
+    # Upsert das linhas já validadas, com histórico, calendário e status das novas e das atualizadas, na transação de
+    # quem chamou. Devolve (estagiários inseridos, estagiários que já existiam e foram atualizados); linhas repetidas
+    # na própria planilha viram um estagiário só, então as duas contagens podem somar menos que as linhas
+    datas_adm = _iso_ou_none(df_validos['data_admissao'])
+    chaves = [chave_identidade(n, u, d) for n, u, d in zip(df_validos['nome'], df_validos['universidade'], datas_adm)]
+    registros = list(zip(
+        df_validos['nome'], df_validos['universidade'],
+        datas_adm, _iso_ou_none(df_validos['data_ult_renovacao']),
+        df_validos['obs'], _iso_ou_none(df_validos['data_vencimento']),
+        [normalize_text(nome) for nome in df_validos['nome']], chaves,
+    ))
+    ultimo_id = conn.execute("SELECT coalesce(max(id), 0) FROM estagiarios").fetchone()[0]
+    # Os já cadastrados, numa consulta pelo índice único; os novos são os ids acima de ultimo_id
+    existentes = [row[0] for row in conn.execute("SELECT id FROM estagiarios WHERE chave_identidade IN (SELECT value FROM json_each(?))", (json.dumps(chaves),))]
+    for inicio in range(0, len(registros), tamanho_lote):
+        conn.executemany(IMPORT_UPSERT_QUERY, registros[inicio:inicio + tamanho_lote])
+        if progresso: progresso(min(inicio + tamanho_lote, len(registros)) / len(registros))
+    filtro, params = f"{FILTRO_IDS} OR id > ?", (json.dumps(existentes), ultimo_id)
+    registrar_historico(conn, "I", "WHERE id > ?", (ultimo_id,))
+    registrar_historico(conn, "U", FILTRO_IDS, params[:1])
+    atualizar_calendario(conn, filtro, params)
+    recalcular_status(conn, filtro, params)
+    conn.execute(VERSAO_UPSERT_QUERY, (DADOS_VERSAO_KEY,))
+    inseridos = conn.execute("SELECT count(*) FROM estagiarios WHERE id > ?", (ultimo_id,)).fetchone()[0]
+    return inseridos, len(existentes)
+
+def descrever_importacao(inseridos: int, atualizados: int, validas: int) -> str:
+    repetidas = validas - inseridos - atualizados
+    return f"{inseridos} estagiários novos, {atualizados} já cadastrados atualizados" + (f", {repetidas} linhas repetidas na planilha" if repetidas else "")
+
+@instrumentado
+def importar_estagiarios(df_validos: pd.DataFrame, progresso=None, tamanho_lote: int = IMPORT_BATCH_SIZE) -> int:
+    # Grava todas as linhas já validadas numa única transação: ou entra a planilha inteira, ou nada. Devolve os inseridos.
+    # Roda na própria sessão (a barra de progresso é do Streamlit) segurando a conexão de escrita; a fila de escrita aguarda
+    with get_pool().escrita() as conn:
+        inseridos, atualizados = _gravar_importados(conn, df_validos, progresso, tamanho_lote)
+        registrar_log(conn, "IMPORTAÇÃO EM LOTE", descrever_importacao(inseridos, atualizados, len(df_validos)))
+    return inseridos
+
+@instrumentado
+def _fracao_lida(arquivo: IO[bytes], tamanho: int) -> float:
+    # Posição do leitor no arquivo: o CSV é lido em sequência e, no .xlsx, a planilha é o grosso do zip e também é
+    # percorrida do começo ao fim, então serve de estimativa sem contar as linhas antes
+    try:
+        return min(arquivo.tell() / tamanho, 1.0) if tamanho else 0.0
+    except (OSError, ValueError):
+        return 0.0
+
+def _tamanho_arquivo(arquivo: IO[bytes]) -> int:
+    try:
+        inicio = arquivo.tell()
+        tamanho = arquivo.seek(0, 2)
+        arquivo.seek(inicio)
+        return tamanho
+    except (OSError, ValueError):
+        return 0
+
+def importar_arquivo(arquivo: IO[bytes], nome_arquivo: str, apenas_validar: bool = False, progresso: Optional[Callable[[int, int, float], None]] = None,
+                     tamanho_lote: int = IMPORT_CHUNK_SIZE) -> Tuple[int, int, int, pd.DataFrame]:
+    # Lê, valida e grava bloco a bloco. Cada bloco é uma escrita própria na fila: a thread de escrita grava um bloco
+    # enquanto o seguinte é lido, então as primeiras linhas entram no banco antes do fim da leitura e a memória fica
+    # limitada a dois blocos. Um erro no meio não desfaz os blocos já gravados (ErroImportacao.importados).
+    # Devolve (linhas válidas, estagiários inseridos, já cadastrados que foram atualizados, linhas rejeitadas com o
+    # motivo); progresso recebe (linhas lidas, estagiários gravados, fração do arquivo já lida)
+    tamanho = _tamanho_arquivo(arquivo)
+    lidas, validas, inseridos, atualizados, rejeitados = 0, 0, 0, 0, []
+    pendente: List[Future] = []
+    def aguardar_bloco():
+        nonlocal inseridos, atualizados
+        # No máximo um bloco na fila: o próximo só é enviado depois que o anterior foi gravado
+        while pendente:
+            try:
+                novos, existentes = aguardar_escrita(pendente[0])
+            finally:
+                # Só sai da lista o bloco resolvido (gravado, com erro ou cancelado); o que ainda está gravando é
+                # esperado de novo no tratamento do erro, para entrar na contagem se chegar ao commit
+                if pendente[0].done(): pendente.pop()
+            inseridos, atualizados = inseridos + novos, atualizados + existentes
+    try:
+        for df in ler_planilha_em_blocos(arquivo, nome_arquivo, tamanho_lote):
+            if not all(col in df.columns for col in IMPORT_COLUNAS_OBRIGATORIAS):
+                raise ErroImportacao(f"O arquivo precisa ter as colunas obrigatórias: {', '.join(IMPORT_COLUNAS_OBRIGATORIAS)}")
+            df_validos, df_rejeitados = validar_importacao(df)
+            lidas, validas = lidas + len(df), validas + len(df_validos)
+            if not df_rejeitados.empty: rejeitados.append(df_rejeitados)
+            if not apenas_validar and not df_validos.empty:
+                aguardar_bloco()
+                pendente.append(enviar_escrita(lambda conn, df_validos=df_validos: _gravar_importados(conn, df_validos)))
+            if progresso: progresso(lidas, inseridos + atualizados, _fracao_lida(arquivo, tamanho))
+        aguardar_bloco()
+        if progresso: progresso(lidas, inseridos + atualizados, 1.0)
+    except Exception as e:
+        try:
+            aguardar_bloco()
+        except Exception:
+            pass
+        importados = inseridos + atualizados
+        if importados:
+            executar_escrita(lambda conn: registrar_log(conn, "IMPORTAÇÃO INTERROMPIDA", f"{inseridos} estagiários novos e {atualizados} atualizados antes do erro: {e}"))
+        if isinstance(e, ErroImportacao): raise
+        em_andamento = ". Um bloco ainda estava sendo gravado e pode entrar no banco; confira antes de reimportar" if pendente else ""
+        raise ErroImportacao(f"Não foi possível importar o arquivo. Erro: {e}{em_andamento}", importados) from e
+    if inseridos or atualizados:
+        executar_escrita(lambda conn: registrar_log(conn, "IMPORTAÇÃO EM LOTE", f"{nome_arquivo}: {descrever_importacao(inseridos, atualizados, validas)}"))
+    return validas, inseridos, atualizados, pd.concat(rejeitados) if rejeitados else pd.DataFrame()
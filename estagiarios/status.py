@@ -0,0 +1,92 @@
+"""Motor de status: próxima renovação, status e "último ano" calculados de forma vetorizada sobre a base."""
+import sqlite3
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from .configuracao import DEFAULT_DURATION_OTHERS, DEFAULT_PROXIMOS_DIAS
+from .metricas import instrumentado
+
+# ==========================
+# Motor de Status
+# ==========================
+def chave_universidade(universidade: str) -> str:
+    return universidade.strip().upper() if isinstance(universidade, str) else ""
+
+def calcular_vencimento_final(data_adm: Optional[date]) -> Optional[date]:
+    return data_adm + relativedelta(months=24) if data_adm else None
+
+def somar_meses(datas: pd.Series, meses: int) -> pd.Series:
+    # Equivalente vetorizado de relativedelta(months=n): mantém o dia, limitado ao fim do mês
+    return datas + pd.DateOffset(months=meses)
+
+def formatar_datas(datas: pd.Series) -> pd.Series:
+    return datas.dt.strftime('%d.%m.%Y').fillna('')
+
+def meses_por_universidade_serie(universidades: pd.Series, regras_meses: Dict[str, int]) -> pd.Series:
+    chaves = universidades.fillna('').astype(str).str.strip().str.upper()
+    meses = chaves.map(regras_meses).fillna(DEFAULT_DURATION_OTHERS).astype(int)
+    return meses.where(chaves != '', DEFAULT_DURATION_OTHERS)
+
+def calcular_proxima_renovacao(df: pd.DataFrame, regras_meses: Dict[str, int], hoje: Optional[date] = None) -> Tuple[pd.Series, pd.Series]:
+    hoje_ts = pd.Timestamp(hoje or date.today())
+    data_adm = df['data_admissao'].dt.normalize()
+    data_ult_renov = df['data_ult_renovacao'].dt.normalize()
+    termo_meses = meses_por_universidade_serie(df['universidade'], regras_meses)
+    limite_2_anos = somar_meses(data_adm, 24)
+    proxima_data = somar_meses(data_ult_renov.fillna(data_adm), 6)
+    condicoes = [
+        data_adm.isna(),
+        termo_meses >= 24,
+        limite_2_anos < hoje_ts,
+        proxima_data > limite_2_anos,
+        proxima_data < hoje_ts,
+    ]
+    rotulos = ["", "Contrato único", "Contrato Encerrado", "Término do Contrato", "Renovação Pendente"]
+    rotulo = np.select(condicoes, rotulos, default="")
+    eh_data = ~np.logical_or.reduce(condicoes)
+    rotulo = pd.Series(np.where(eh_data, formatar_datas(proxima_data), rotulo), index=df.index)
+    return rotulo, proxima_data.where(eh_data)
+
+@instrumentado
+def calcular_status(df: pd.DataFrame, proximos_dias: int, regras_meses: Dict[str, int], hoje: Optional[date] = None) -> pd.DataFrame:
+    hoje = hoje or date.today()
+    proxima_renovacao, proxima_data = calcular_proxima_renovacao(df, regras_meses, hoje)
+    data_alvo = proxima_data.fillna(df['data_vencimento'].dt.normalize())
+    delta = (data_alvo - pd.Timestamp(hoje)).dt.days
+    status = np.select(
+        [proxima_renovacao == "Renovação Pendente", data_alvo.isna(), delta < 0, delta <= proximos_dias],
+        ["Vencido", "SEM DATA", "Vencido", "Venc.Proximo"],
+        default="OK",
+    )
+    ultimo_ano = np.where(df['data_vencimento'].dt.year == hoje.year, "SIM", "NÃO")
+    return pd.DataFrame({'proxima_renovacao': proxima_renovacao, 'status': status, 'ultimo_ano': ultimo_ano}, index=df.index)
+
+def ler_contratos(conn: sqlite3.Connection, filtro: str = "", params: tuple = ()) -> pd.DataFrame:
+    # Só os campos de que o motor precisa, já com as datas convertidas.
+    # Lido pelo cursor (e não por pd.read_sql_query) para funcionar igual na conexão do primário libsql
+    cursor = conn.execute(f"SELECT id, universidade, data_admissao, data_ult_renovacao, data_vencimento FROM estagiarios {filtro}", params)
+    df = pd.DataFrame([tuple(row) for row in cursor.fetchall()], columns=[d[0] for d in cursor.description])
+    for col in ['data_admissao', 'data_ult_renovacao', 'data_vencimento']:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+def ler_regras_meses(conn: sqlite3.Connection) -> Dict[str, int]:
+    return {chave_universidade(row['keyword']): int(row['meses']) for row in conn.execute("SELECT keyword, meses FROM regras")}
+
+@instrumentado
+def recalcular_status(conn: sqlite3.Connection, filtro: str = "", params: tuple = ()):
+    # Recalcula e grava os campos derivados das linhas do filtro, dentro da transação de quem chamou
+    df = ler_contratos(conn, filtro, params)
+    if df.empty: return
+    regras_meses = ler_regras_meses(conn)
+    row = conn.execute("SELECT value FROM config WHERE key='proximos_dias'").fetchone()
+    proximos_dias = int(row['value']) if row else DEFAULT_PROXIMOS_DIAS
+    campos = calcular_status(df, proximos_dias, regras_meses)
+    # Só as linhas que mudaram são gravadas (e entram no diário de alterações que a réplica copia)
+    conn.executemany(
+        "UPDATE estagiarios SET proxima_renovacao=?, status=?, ultimo_ano=? WHERE id=? AND (proxima_renovacao, status, ultimo_ano) IS NOT (?, ?, ?)",
+        ((p, s, u, i, p, s, u) for p, s, u, i in zip(campos['proxima_renovacao'], campos['status'], campos['ultimo_ano'], df['id'].tolist())))
@@ -0,0 +1,65 @@
+"""Tarefa em lote do Controle de Estagiários (para agendar à noite), sem Streamlit.
+
+Uso: python lote_status.py [--banco estagiarios.db] [--saida relatorio.xlsx] [--formato xlsx|csv] [--alertar]
+
+Recalcula o status de toda a base em lotes, arquiva os logs fora do período de retenção e grava o relatório
+dos contratos "Vencido"/"Venc.Proximo" (mesmas colunas do Dashboard).
+
+Código de saída: 0 concluído, 1 erro, 2 concluído mas com contratos vencidos (só com --alertar,
+para o agendador avisar alguém).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+from estagiarios import configuracao
+from estagiarios.banco import executar_escrita, get_pool
+from estagiarios.dados import recalcular_status_em_lotes
+from estagiarios.logs import arquivar_logs
+from estagiarios.migracoes import init_db
+from estagiarios.planilhas import gerar_relatorio_vencimentos
+
+SAIDA_OK = 0
+SAIDA_ERRO = 1
+SAIDA_VENCIDOS = 2
+
+
+def executar(args) -> int:
+    inicio = time.perf_counter()
+    if not configuracao.DB_PRIMARY_URL and not os.path.exists(configuracao.DB_FILE):
+        print(f"Banco não encontrado: {configuracao.DB_FILE}", file=sys.stderr)
+        return SAIDA_ERRO
+    init_db()
+    total = recalcular_status_em_lotes(args.tamanho_lote, progresso=lambda n: print(f"  {n} estagiários recalculados", flush=True))
+    print(f"Status recalculado: {total} estagiários")
+    if not args.sem_arquivar:
+        print(f"Logs arquivados: {executar_escrita(arquivar_logs)}")
+    saida = args.saida or f"relatorio_vencimentos_{date.today().isoformat()}.{args.formato}"
+    contagem = gerar_relatorio_vencimentos(saida, args.formato, tamanho_lote=args.tamanho_lote)
+    print(f"Relatório gravado em {saida}: " + ", ".join(f"{s}: {n}" for s, n in contagem.items()))
+    print(f"Concluído em {time.perf_counter() - inicio:.1f}s")
+    return SAIDA_VENCIDOS if args.alertar and contagem.get("Vencido", 0) else SAIDA_OK
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Recálculo noturno de status e relatório de vencimentos")
+    parser.add_argument("--banco", help="arquivo SQLite (padrão: ESTAGIARIOS_DB_FILE ou o caminho configurado)")
+    parser.add_argument("--saida", help="arquivo do relatório (padrão: relatorio_vencimentos_<data>.<formato>)")
+    parser.add_argument("--formato", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--tamanho-lote", type=int, default=configuracao.STATUS_BATCH_SIZE)
+    parser.add_argument("--sem-arquivar", action="store_true", help="não arquiva os logs antigos")
+    parser.add_argument("--alertar", action="store_true", help=f"sai com {SAIDA_VENCIDOS} se houver contratos vencidos")
+    args = parser.parse_args()
+    if args.banco: configuracao.DB_FILE = args.banco
+    try:
+        return executar(args)
+    except Exception as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return SAIDA_ERRO
+    finally:
+        # Espera a fila de escrita esvaziar antes de sair (a thread de escrita é daemon)
+        get_pool().fechar()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from estagiarios import banco, calendario, configuracao, dados, migracoes, planilhas
+
+
+def _banco_novo(monkeypatch, db_file: str, url_primario: str = ""):
+    # Os caches dos módulos são zerados porque as versões recomeçam do zero
+    monkeypatch.setattr(configuracao, "DB_FILE", db_file)
+    monkeypatch.setattr(configuracao, "DB_PRIMARY_URL", url_primario)
+    dados._indice_regras = (None, {})
+    dados._snapshot_estagiarios = (None, pd.DataFrame())
+    dados._status_calculado_em = None
+    planilhas._exportacoes_em_cache = {}
+    calendario._semanas_em_cache = (None, {})
+    migracoes.init_db()
+
+@pytest.fixture
+def banco_temporario(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "estagiarios.db")
+    _banco_novo(monkeypatch, caminho)
+    yield caminho
+    banco.get_pool().fechar()
+
+@pytest.fixture
+def banco_original(tmp_path, monkeypatch):
+    # Banco criado por uma versão antiga do app, só com a tabela de estagiários original; devolve migrar(versao), que
+    # aplica as migrações até a versão dada
+    caminho = str(tmp_path / "original.db")
+    conn = sqlite3.connect(caminho)
+    conn.execute("CREATE TABLE estagiarios (id INTEGER PRIMARY KEY, nome TEXT NOT NULL, universidade TEXT NOT NULL, data_admissao TEXT NOT NULL, data_ult_renovacao TEXT, obs TEXT, data_vencimento TEXT)")
+    conn.close()
+    todas = migracoes.MIGRACOES
+    def migrar(versao: int):
+        monkeypatch.setattr(migracoes, "MIGRACOES", [m for m in todas if m[0] <= versao])
+        _banco_novo(monkeypatch, caminho)
+    yield migrar
+    banco.get_pool().fechar()
+
+@pytest.fixture
+def banco_replica(tmp_path, monkeypatch):
+    # Primário libsql num arquivo local (file:), com a réplica de leitura em DB_FILE; devolve o caminho do primário
+    pytest.importorskip("libsql_client")
+    primario = str(tmp_path / "primario.db")
+    _banco_novo(monkeypatch, str(tmp_path / "replica.db"), f"file:{primario}")
+    yield primario
+    banco.get_pool().fechar()
@@ -0,0 +1,29 @@
+import gzip
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from estagiarios import backup
+from estagiarios.banco import execute_write_query
+
+
+@pytest.mark.parametrize("compactar", [False, True])
+def test_backup_para_download_devolve_bytes_e_apaga_temporario(banco_temporario, tmp_path, monkeypatch, compactar):
+    execute_write_query("INSERT INTO config(key, value) VALUES(?, ?)", ("teste_backup", "1"))
+    criados = []
+    mkdtemp = tempfile.mkdtemp
+    monkeypatch.setattr(tempfile, "mkdtemp", lambda **kw: criados.append(mkdtemp(**kw)) or criados[-1])
+
+    conteudo = backup.backup_para_download(compactar)
+
+    assert isinstance(conteudo, bytes)
+    assert criados and not os.path.exists(criados[0])
+    restaurado = tmp_path / "restaurado.db"
+    restaurado.write_bytes(gzip.decompress(conteudo) if compactar else conteudo)
+    conn = sqlite3.connect(restaurado)
+    try:
+        assert conn.execute("SELECT value FROM config WHERE key = 'teste_backup'").fetchone() == ("1",)
+    finally:
+        conn.close()
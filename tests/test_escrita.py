@@ -0,0 +1,91 @@
+import io
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from estagiarios import banco, planilhas
+from estagiarios.banco import EscritaEmAndamento, ErroEscrita, aguardar_escrita, enviar_escrita, get_config, get_db_connection
+
+SESSOES = 16
+ESCRITAS_POR_SESSAO = 25
+
+
+def ocupar_escritor(liberar: threading.Event):
+    # Segura a thread de escrita até o evento, para o próximo envio ficar na fila
+    ocupada = enviar_escrita(lambda conn: liberar.wait(5))
+    while not ocupada.running(): time.sleep(0.01)
+    return ocupada
+
+def test_sessoes_concorrentes_tem_cada_escrita_gravada_uma_vez(banco_temporario):
+    # Cada thread faz o papel de uma sessão do Streamlit: enfileira suas escritas ao mesmo tempo que as outras, e uma
+    # delas falha de propósito (NOT NULL) sem levar junto as demais do mesmo commit em grupo. logs não tem chave
+    # única nos detalhes, então uma escrita gravada duas vezes apareceria repetida na contagem
+    largada = threading.Barrier(SESSOES)
+    futuros, falhas = {}, {}
+    inserir = "INSERT INTO logs(timestamp, action, details) VALUES(?, 'CONCORRENCIA', ?)"
+    def sessao(n: int):
+        largada.wait(5)
+        futuros[n] = [enviar_escrita(lambda conn, i=i: conn.execute(inserir, ("2024-01-01 10:00:00", f"s{n}-{i}")).rowcount)
+                      for i in range(ESCRITAS_POR_SESSAO)]
+        falhas[n] = enviar_escrita(lambda conn: conn.execute(inserir, (None, f"s{n}-falha")))
+    sessoes = [threading.Thread(target=sessao, args=(n,)) for n in range(SESSOES)]
+    for t in sessoes: t.start()
+    for t in sessoes: t.join(10)
+
+    assert sorted(futuros) == list(range(SESSOES))
+    assert all(futuro.result(timeout=10) == 1 for lista in futuros.values() for futuro in lista)
+    for falha in falhas.values():
+        with pytest.raises(sqlite3.IntegrityError):
+            falha.result(timeout=10)
+    with get_db_connection() as conn:
+        gravadas = [row[0] for row in conn.execute("SELECT details FROM logs WHERE action = 'CONCORRENCIA'")]
+    assert len(gravadas) == SESSOES * ESCRITAS_POR_SESSAO
+    assert set(gravadas) == {f"s{n}-{i}" for n in range(SESSOES) for i in range(ESCRITAS_POR_SESSAO)}
+    assert banco.get_pool().escritor.total_commits < SESSOES * (ESCRITAS_POR_SESSAO + 1)
+
+def test_prazo_esgotado_cancela_tarefa_ainda_na_fila(banco_temporario):
+    liberar = threading.Event()
+    ocupada = ocupar_escritor(liberar)
+    futuro = enviar_escrita(lambda conn: conn.execute("INSERT INTO config(key, value) VALUES('cancelada', '1')"))
+    with pytest.raises(ErroEscrita) as erro:
+        aguardar_escrita(futuro, timeout=0.1)
+    assert not isinstance(erro.value, EscritaEmAndamento)
+    assert futuro.cancelled()
+    liberar.set()
+    ocupada.result(timeout=5)
+    banco.execute_write_query("INSERT INTO config(key, value) VALUES('depois', '1')")
+    assert get_config("cancelada") == "" and get_config("depois") == "1"
+
+def test_prazo_esgotado_com_tarefa_em_execucao_nao_e_falha(banco_temporario):
+    liberar = threading.Event()
+    def tarefa(conn):
+        liberar.wait(5)
+        conn.execute("INSERT INTO config(key, value) VALUES('em_andamento', '1')")
+        return "ok"
+    futuro = enviar_escrita(tarefa)
+    while not futuro.running(): time.sleep(0.01)
+    with pytest.raises(EscritaEmAndamento):
+        aguardar_escrita(futuro, timeout=0.1)
+    liberar.set()
+    assert futuro.result(timeout=5) == "ok"
+    assert get_config("em_andamento") == "1"
+
+def test_importacao_conta_bloco_que_terminou_depois_do_prazo(banco_temporario, monkeypatch):
+    gravar = planilhas._gravar_importados
+    chamadas = []
+    def gravar_lento(conn, df_validos, *args):
+        # Só o primeiro bloco passa do prazo; ele termina durante a espera do tratamento do erro
+        chamadas.append(len(df_validos))
+        if len(chamadas) == 1: time.sleep(0.3)
+        return gravar(conn, df_validos, *args)
+    monkeypatch.setattr(planilhas, "_gravar_importados", gravar_lento)
+    monkeypatch.setattr(planilhas, "aguardar_escrita", lambda futuro: aguardar_escrita(futuro, timeout=0.2))
+    csv = "nome,universidade,data_admissao\n" + "".join(f"ESTAGIARIO {i},UFRJ,2024-01-{i + 1:02d}\n" for i in range(6))
+
+    with pytest.raises(planilhas.ErroImportacao) as erro:
+        planilhas.importar_arquivo(io.BytesIO(csv.encode()), "teste.csv", tamanho_lote=3)
+
+    assert erro.value.importados == 3
+    assert "ainda estava sendo gravado" not in str(erro.value)
@@ -0,0 +1,15 @@
+from estagiarios import banco
+from estagiarios.metricas import medicao_do_rerun
+
+
+def test_sql_da_thread_de_escrita_conta_no_rerun_que_enviou(banco_temporario):
+    with medicao_do_rerun() as medicao:
+        banco.execute_write_query("INSERT INTO config(key, value) VALUES('medido', '1')")
+    assert any("INSERT INTO config" in sql for _, sql in medicao.consultas)
+    assert medicao.resumo["funcoes"]["executar_escrita"]["chamadas"] == 1
+
+def test_escrita_fora_de_rerun_nao_vaza_para_a_proxima_medicao(banco_temporario):
+    banco.execute_write_query("INSERT INTO config(key, value) VALUES('sem_rerun', '1')")
+    with medicao_do_rerun() as medicao:
+        banco.get_config("sem_rerun")
+    assert not any("sem_rerun" in sql or "INSERT INTO config" in sql for _, sql in medicao.consultas)
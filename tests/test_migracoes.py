@@ -0,0 +1,36 @@
+from datetime import date
+
+from estagiarios import dados, migracoes
+from estagiarios.banco import get_db_connection
+from estagiarios.historico import historico_estagiario
+
+
+def inserir(nome: str) -> int:
+    dados.insert_estagiario(nome, "UFRJ", date(2024, 1, 1), None, "", date(2026, 1, 1))
+    with get_db_connection() as conn:
+        return conn.execute("SELECT id FROM estagiarios WHERE nome = ?", (nome,)).fetchone()[0]
+
+def test_id_excluido_antes_da_migracao_nao_e_reusado(banco_original):
+    # Até a migração 10 o maior id excluído voltava no próximo cadastro, junto com o histórico do excluído
+    migrar, ultima = banco_original, migracoes.MIGRACOES[-1][0]
+    migrar(10)
+    inserir("PRIMEIRO")
+    excluido = inserir("SEGUNDO")
+    dados.delete_estagiario(excluido, "SEGUNDO")
+
+    migrar(ultima)
+    novo = inserir("TERCEIRO")
+
+    assert novo > excluido
+    assert historico_estagiario(novo)["nome"].tolist() == ["TERCEIRO"]
+    with get_db_connection() as conn:
+        assert "AUTOINCREMENT" in conn.execute("SELECT sql FROM sqlite_master WHERE name = 'estagiarios'").fetchone()[0]
+        indices = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'estagiarios'")}
+    assert {"idx_estagiarios_nome_normalizado", "idx_estagiarios_status", "idx_estagiarios_chave_identidade"} <= indices
+    assert dados.get_estagiarios_df()["nome"].tolist() == ["PRIMEIRO", "TERCEIRO"]
+
+def test_banco_novo_nao_reusa_id_excluido(banco_temporario):
+    inserir("PRIMEIRO")
+    excluido = inserir("SEGUNDO")
+    dados.delete_estagiario(excluido, "SEGUNDO")
+    assert inserir("TERCEIRO") > excluido
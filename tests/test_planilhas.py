@@ -0,0 +1,52 @@
+import io
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from estagiarios.dados import get_estagiarios_df
+from estagiarios.logs import list_logs_df
+from estagiarios.planilhas import importar_arquivo, ler_planilha_em_blocos, validar_importacao
+
+
+def validar_csv(texto: str) -> pd.DataFrame:
+    blocos = list(ler_planilha_em_blocos(io.BytesIO(texto.encode("utf-8-sig")), "importacao.csv"))
+    validos, rejeitados = validar_importacao(pd.concat(blocos))
+    assert rejeitados.empty, rejeitados
+    return validos
+
+@pytest.mark.parametrize("digitada", ["03/04/2024", "3/4/2024", "03.04.2024", "2024-04-03", "2024-04-03 10:00:00", "03/04/2024 10:00"])
+def test_data_ambigua_do_csv_e_lida_com_o_dia_primeiro(digitada):
+    validos = validar_csv(f"nome;universidade;data_admissao;data_ult_renovacao\nANA;UFRJ;{digitada};{digitada}\n")
+    assert validos['data_admissao'].iloc[0] == pd.Timestamp(2024, 4, 3)
+    assert validos['data_ult_renovacao'].iloc[0] == pd.Timestamp(2024, 4, 3)
+
+def test_datas_misturadas_na_mesma_coluna():
+    validos = validar_csv("nome,universidade,data_admissao,data_ult_renovacao\nANA,UFRJ,2024-04-03,\nBIA,UFRJ,13/04/2024,\nCAIO,UFRJ,03/04/2024,01/10/2024\n")
+    assert validos['data_admissao'].tolist() == [pd.Timestamp(2024, 4, 3), pd.Timestamp(2024, 4, 13), pd.Timestamp(2024, 4, 3)]
+    assert validos['data_ult_renovacao'].isna().tolist() == [True, True, False]
+    assert validos['data_ult_renovacao'].iloc[2] == pd.Timestamp(2024, 10, 1)
+
+def test_celulas_de_data_do_xlsx_nao_sao_reinterpretadas():
+    df = pd.DataFrame({"nome": ["ANA", "BIA"], "universidade": ["UFRJ", "UFRJ"], "data_admissao": [datetime(2024, 4, 3), "03/04/2024"]})
+    validos, _ = validar_importacao(df)
+    assert validos['data_admissao'].tolist() == [pd.Timestamp(2024, 4, 3), pd.Timestamp(2024, 4, 3)]
+
+def test_data_invalida_e_rejeitada():
+    df = pd.DataFrame({"nome": ["ANA", "BIA"], "universidade": ["UFRJ", "UFRJ"], "data_admissao": ["31/02/2024", "sem data"]})
+    validos, rejeitados = validar_importacao(df)
+    assert validos.empty
+    assert rejeitados['motivo_rejeicao'].tolist() == ["data_admissao inválida", "data_admissao inválida"]
+
+def test_importacao_conta_inseridos_e_atualizados_sem_as_repetidas(banco_temporario):
+    importar_arquivo(io.BytesIO("nome,universidade,data_admissao\nANA,UFRJ,2024-01-10\n".encode()), "antes.csv")
+    # BIA aparece duas vezes na planilha (vira um estagiário só) e ANA já estava cadastrada
+    csv = "nome,universidade,data_admissao\nBIA,UFRJ,2024-02-01\nbia ,ufrj,01/02/2024\nANA,UFRJ,10/01/2024\nCAIO,UFF,2024-03-01\n"
+
+    validas, inseridos, atualizados, rejeitados = importar_arquivo(io.BytesIO(csv.encode()), "planilha.csv")
+
+    assert (validas, inseridos, atualizados) == (4, 2, 1)
+    assert rejeitados.empty
+    assert len(get_estagiarios_df()) == 3
+    assert list_logs_df(date.today(), date.today())['details'].iloc[0] == (
+        "planilha.csv: 2 estagiários novos, 1 já cadastrados atualizados, 1 linhas repetidas na planilha")
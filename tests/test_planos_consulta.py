@@ -0,0 +1,72 @@
+"""EXPLAIN QUERY PLAN das consultas quentes: o SQL é o que as próprias funções executam, capturado pela instrumentação."""
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from estagiarios import calendario, dados, logs, metricas, planilhas
+from estagiarios.banco import get_db_connection, get_pool
+from estagiarios.logs import LOG_INSERT_QUERY
+from estagiarios.metricas import medicao_do_rerun
+
+
+@pytest.fixture
+def base(banco_temporario, monkeypatch):
+    # SQL completo na medição (o padrão corta em PERF_SQL_MAX_CHARS)
+    monkeypatch.setattr(metricas, "PERF_SQL_MAX_CHARS", 100000)
+    hoje = date.today()
+    df = pd.DataFrame({
+        "nome": [f"ESTAGIARIO {i}" for i in range(200)],
+        "universidade": ["UFRJ", "UERJ", "UFF", "PUC-RIO"] * 50,
+        "data_admissao": [hoje - timedelta(days=5 * i) for i in range(200)],
+    })
+    validos, _ = planilhas.validar_importacao(df)
+    planilhas.importar_estagiarios(validos)
+    with get_pool().escrita() as conn:
+        conn.executemany(LOG_INSERT_QUERY, [(f"{hoje - timedelta(days=i % 400)} 10:00:00", "TESTE", str(i)) for i in range(2000)])
+    return hoje
+
+def planos(funcao, tabela: str) -> dict:
+    # {sql: plano} das leituras da tabela feitas pela função
+    with medicao_do_rerun() as medicao:
+        funcao()
+    consultas = {sql for _, sql in medicao.consultas if sql.upper().startswith("SELECT") and f" FROM {tabela} " in f"{sql} "}
+    assert consultas, f"nenhuma consulta em {tabela}"
+    with get_db_connection() as conn:
+        return {sql: " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", ("0",) * sql.count("?"))) for sql in consultas}
+
+def test_filtro_de_logs_usa_indice_de_timestamp(base):
+    inicio, fim = base - timedelta(days=30), base
+    for funcao in [lambda: logs.list_logs_df(inicio, fim), lambda: list(logs.gerar_exportacao_logs(inicio, fim, "csv"))]:
+        for sql, plano in planos(funcao, "logs").items():
+            assert "SEARCH logs USING INDEX idx_logs_timestamp" in plano or "SEARCH logs USING COVERING INDEX idx_logs_timestamp" in plano, (sql, plano)
+
+def test_snapshot_ordenado_pelo_indice_de_vencimento(base):
+    dados._snapshot_estagiarios = (None, pd.DataFrame())
+    for sql, plano in planos(dados.get_estagiarios_df, "estagiarios").items():
+        if "ORDER BY data_vencimento" not in sql: continue
+        assert "SCAN estagiarios USING INDEX idx_estagiarios_data_vencimento" in plano, (sql, plano)
+        assert "TEMP B-TREE" not in plano, (sql, plano)
+
+def test_filtro_e_contagem_por_status_usam_indice(base):
+    for funcao in [lambda: dados.consultar_estagiarios(["Vencido", "Venc.Proximo"], ""), dados.contar_status]:
+        for sql, plano in planos(funcao, "estagiarios").items():
+            assert "idx_estagiarios_status" in plano, (sql, plano)
+
+def test_busca_por_nome_usa_indice_de_nome(base):
+    for funcao in [lambda: dados.buscar_estagiarios_por_nome("estagiario 1"), lambda: dados.consultar_estagiarios(None, "Estagiário 1")]:
+        for sql, plano in planos(funcao, "estagiarios").items():
+            assert "USING INDEX idx_estagiarios_nome_normalizado" in plano or "USING COVERING INDEX idx_estagiarios_nome_normalizado" in plano, (sql, plano)
+
+def test_busca_por_nome_pelo_inicio_sem_acentos(base):
+    df, total = dados.buscar_estagiarios_por_nome("  Estagiário 19")
+    assert total == 11 and len(df) == 11
+    assert set(df["nome"]) == {"ESTAGIARIO 19"} | {f"ESTAGIARIO 19{i}" for i in range(10)}
+    assert dados.consultar_estagiarios(None, "giario 1")[1] == 0
+
+def test_consultas_do_calendario_usam_indice_de_data(base):
+    calendario._semanas_em_cache = (None, {})
+    inicio, fim = calendario.periodo_padrao(base)
+    for funcao in [lambda: calendario.eventos_por_semana(inicio, fim), lambda: calendario.eventos_no_periodo(inicio, fim)]:
+        for sql, plano in planos(funcao, "calendario_renovacoes").items():
+            assert "USING COVERING INDEX idx_calendario_renovacoes_data_evento" in plano or "USING INDEX idx_calendario_renovacoes_data_evento" in plano, (sql, plano)
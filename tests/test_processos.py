@@ -0,0 +1,101 @@
+"""Vários processos no mesmo banco: caches por processo (config e snapshot dos estagiários) com outro processo gravando,
+em que nenhuma leitura volta no tempo, e processos subindo juntos num banco que ainda precisa de migrações."""
+import multiprocessing
+import sqlite3
+from datetime import date
+
+from estagiarios import banco, configuracao, dados, migracoes
+
+ESCRITAS = 30
+PROCESSOS_INICIANDO = 4
+
+
+def _usar_banco(db_file: str):
+    configuracao.DB_FILE = db_file
+    configuracao.DB_PRIMARY_URL = ""
+
+def leitor(db_file: str, est_id: int, tipo: str, publicado, fim, resultados):
+    # Antes de cada leitura guarda a última escrita já confirmada pelo outro processo; ler algo mais antigo é dado velho
+    _usar_banco(db_file)
+    ler = (lambda: int(banco.get_config("contador", "0"))) if tipo == "config" else (
+        lambda: int(dados.get_estagiarios_df().set_index("id").at[est_id, "obs"] or 0))
+    ler()
+    resultados.put(("pronto", tipo))
+    leituras, velhas = 0, []
+    try:
+        while not fim.is_set():
+            minimo = publicado.value
+            valor = ler()
+            leituras += 1
+            if valor < minimo: velhas.append((minimo, valor))
+        resultados.put((tipo, leituras, velhas, ler()))
+    finally:
+        banco.get_pool().fechar()
+
+def escritor(db_file: str, est_id: int, publicado):
+    _usar_banco(db_file)
+    try:
+        for i in range(1, ESCRITAS + 1):
+            banco.set_config("contador", str(i))
+            dados.update_estagiario(est_id, "ESTAGIARIO", "UFRJ", date(2024, 1, 1), None, str(i), date(2026, 1, 1))
+            publicado.value = i
+    finally:
+        banco.get_pool().fechar()
+
+def inicializador(db_file: str, largada):
+    _usar_banco(db_file)
+    largada.wait(timeout=60)
+    try:
+        migracoes.init_db()
+    finally:
+        banco.get_pool().fechar()
+
+def test_processos_iniciando_juntos_aplicam_cada_migracao_uma_vez(tmp_path):
+    # Banco no esquema de antes das migrações, com dados, e vários processos chamando init_db() ao mesmo tempo
+    db_file = str(tmp_path / "antigo.db")
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("CREATE TABLE estagiarios (id INTEGER PRIMARY KEY, nome TEXT NOT NULL, universidade TEXT NOT NULL, data_admissao TEXT NOT NULL, data_ult_renovacao TEXT, obs TEXT, data_vencimento TEXT)")
+        conn.executemany("INSERT INTO estagiarios(nome, universidade, data_admissao, data_vencimento) VALUES (?, ?, ?, ?)",
+                         [(f"ESTAGIARIO {i}", "UFRJ", "2024-01-01", "2026-01-01") for i in range(500)])
+    conn.close()
+
+    ctx = multiprocessing.get_context("spawn")
+    largada = ctx.Barrier(PROCESSOS_INICIANDO)
+    processos = [ctx.Process(target=inicializador, args=(db_file, largada)) for _ in range(PROCESSOS_INICIANDO)]
+    for p in processos: p.start()
+    for p in processos: p.join(timeout=120)
+    assert [p.exitcode for p in processos] == [0] * PROCESSOS_INICIANDO
+
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("SELECT value FROM config WHERE key=?", (configuracao.SCHEMA_VERSION_KEY,)).fetchone()[0] == str(migracoes.MIGRACOES[-1][0])
+        assert conn.execute("SELECT COUNT(*), COUNT(nome_normalizado), COUNT(status) FROM estagiarios").fetchone() == (500, 500, 500)
+        # O histórico é semeado pela migração: rodando duas vezes, cada estagiário teria duas versões iniciais
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM estagiarios_history").fetchone() == (500, 500)
+    finally:
+        conn.close()
+
+def test_leitores_de_outros_processos_nunca_veem_dado_velho(banco_temporario):
+    dados.insert_estagiario("ESTAGIARIO", "UFRJ", date(2024, 1, 1), None, "0", date(2026, 1, 1))
+    est_id = int(dados.get_estagiarios_df()["id"].iloc[0])
+    banco.get_pool().fechar()
+
+    ctx = multiprocessing.get_context("spawn")
+    publicado, fim, resultados = ctx.Value("i", 0), ctx.Event(), ctx.Queue()
+    leitores = [ctx.Process(target=leitor, args=(banco_temporario, est_id, tipo, publicado, fim, resultados)) for tipo in ["config", "estagiarios"]]
+    for p in leitores: p.start()
+    try:
+        assert sorted(resultados.get(timeout=60)[1] for _ in leitores) == ["config", "estagiarios"]
+        gravador = ctx.Process(target=escritor, args=(banco_temporario, est_id, publicado))
+        gravador.start()
+        gravador.join(timeout=60)
+        assert gravador.exitcode == 0
+        fim.set()
+        finais = {tipo: (leituras, velhas, ultimo) for tipo, leituras, velhas, ultimo in (resultados.get(timeout=60) for _ in leitores)}
+    finally:
+        fim.set()
+        for p in leitores: p.join(timeout=60)
+    for tipo, (leituras, velhas, ultimo) in finais.items():
+        assert leituras > 0, tipo
+        assert velhas == [], tipo
+        assert ultimo == ESCRITAS, tipo
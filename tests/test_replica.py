@@ -0,0 +1,114 @@
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from estagiarios import banco, configuracao, dados, planilhas
+from estagiarios.banco import PoolReplicaLibsql, get_pool
+from estagiarios.status import recalcular_status
+
+TABELAS = ["estagiarios", "calendario_renovacoes", "estagiarios_history", "config", "logs"]
+
+
+def linhas(caminho: str, tabela: str) -> list:
+    conn = sqlite3.connect(caminho)
+    try:
+        return sorted(conn.execute(f"SELECT * FROM {tabela}").fetchall(), key=repr)
+    finally:
+        conn.close()
+
+def assert_replica_igual(primario: str):
+    for tabela in TABELAS:
+        assert linhas(configuracao.DB_FILE, tabela) == linhas(primario, tabela), tabela
+
+def importar(n: int):
+    df = pd.DataFrame({"nome": [f"ESTAGIARIO {i}" for i in range(n)], "universidade": ["UFRJ"] * n, "data_admissao": [date(2024, 1, 1)] * n})
+    validos, _ = planilhas.validar_importacao(df)
+    planilhas.importar_estagiarios(validos)
+
+def test_replica_copia_so_os_ids_alterados(banco_replica, monkeypatch):
+    importar(300)
+    # A segunda importação atualiza os mesmos estagiários pelo upsert
+    importar(300)
+    assert_replica_igual(banco_replica)
+    copias = []
+    copiar = PoolReplicaLibsql._copiar_tabela
+    def espiar(self, primario, replica, tabela, filtro="", params=()):
+        if tabela in banco.REPLICA_POR_ALTERACOES: copias.append((tabela, filtro, params))
+        return copiar(self, primario, replica, tabela, filtro, params)
+    monkeypatch.setattr(PoolReplicaLibsql, "_copiar_tabela", espiar)
+    ids = dados.get_estagiarios_df()['id'].tolist()
+
+    dados.update_estagiario(ids[0], "OUTRO NOME", "UFRJ", date(2024, 1, 1), date(2024, 7, 1), "", date(2026, 1, 1))
+    dados.delete_estagiario(ids[1], "ESTAGIARIO 1")
+
+    # Cada escrita recopia só o próprio id, nas duas tabelas; o excluído sai da réplica
+    assert [(tabela, params) for tabela, _, params in copias] == [
+        ("estagiarios", (f"[{ids[0]}]",)), ("calendario_renovacoes", (f"[{ids[0]}]",)),
+        ("estagiarios", (f"[{ids[1]}]",)), ("calendario_renovacoes", (f"[{ids[1]}]",)),
+    ]
+    assert_replica_igual(banco_replica)
+    copias.clear()
+    # Recalcular sem mudança de status não grava nada, então não há o que copiar
+    banco.executar_escrita(recalcular_status)
+    assert copias == []
+
+def test_banco_local_nao_mantem_o_diario(banco_temporario):
+    importar(20)
+    dados.update_estagiario(int(dados.get_estagiarios_df()['id'].iloc[0]), "OUTRO NOME", "UFRJ", date(2024, 1, 1), None, "", date(2026, 1, 1))
+    dados.add_regra("UFRJ", 12)
+    conn = sqlite3.connect(banco_temporario)
+    try:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall() == []
+        assert conn.execute(f"SELECT count(*) FROM {banco.ALTERACOES_TABELA}").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+def test_replica_recria_triggers_ausentes_e_recopia_tudo(banco_replica):
+    importar(30)
+    # Primário sem os triggers (como depois da migração que os tirou do banco local) e com alterações fora do diário
+    conn = sqlite3.connect(banco_replica)
+    try:
+        for nome in banco.ALTERACOES_TRIGGERS: conn.execute(f"DROP TRIGGER {nome}")
+        conn.execute(f"DELETE FROM {banco.ALTERACOES_TABELA}")
+        conn.execute("UPDATE estagiarios SET obs = 'fora do diário'")
+        conn.commit()
+    finally:
+        conn.close()
+    get_pool().sincronizar()
+    assert_replica_igual(banco_replica)
+    conn = sqlite3.connect(banco_replica)
+    try:
+        assert {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")} == set(banco.ALTERACOES_TRIGGERS)
+    finally:
+        conn.close()
+    # E dali em diante segue pelo diário
+    dados.delete_estagiario(int(dados.get_estagiarios_df()['id'].iloc[0]), "ESTAGIARIO 0")
+    assert_replica_igual(banco_replica)
+
+def test_sincronizacao_depois_do_commit_nao_segura_o_lock_de_escrita(banco_replica):
+    pool = get_pool()
+    pool._lock_sincronizacao.acquire()
+    try:
+        escrita = threading.Thread(target=banco.execute_write_query, args=("INSERT INTO config(key, value) VALUES('x', '1')",))
+        escrita.start()
+        # O commit já saiu e a thread de escrita espera a sincronização, fora do lock de escrita
+        time.sleep(0.2)
+        assert escrita.is_alive()
+        assert pool._lock_escrita.acquire(timeout=1)
+        pool._lock_escrita.release()
+    finally:
+        pool._lock_sincronizacao.release()
+    escrita.join(timeout=5)
+    assert banco.get_config("x") == "1"
+
+def test_mudanca_de_regra_copia_o_calendario_dos_afetados(banco_replica):
+    importar(50)
+    df = pd.DataFrame({"nome": [f"OUTRO {i}" for i in range(50)], "universidade": ["UERJ"] * 50, "data_admissao": [date(2024, 1, 1)] * 50})
+    planilhas.importar_estagiarios(planilhas.validar_importacao(df)[0])
+    # Contrato único (24 meses) na UERJ: somem as renovações do calendário, sem mudar o cadastro
+    dados.add_regra("UERJ", 24)
+    assert_replica_igual(banco_replica)
+    assert linhas(configuracao.DB_FILE, "calendario_renovacoes") != []
@@ -0,0 +1,80 @@
+"""Equivalência do motor vetorizado de status com o cálculo linha a linha original (datas aleatórias)."""
+import random
+from datetime import date, timedelta
+from typing import Dict
+
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from estagiarios.configuracao import DEFAULT_DURATION_OTHERS
+from estagiarios.status import calcular_status
+
+REGRAS = {"UFRJ": 12, "UERJ": 24, "UFF": 6, "PUC-RIO": 18}
+UNIVERSIDADES = list(REGRAS) + ["ESTACIO", "FACULDADE X", ""]
+
+
+# Implementação original (por linha), usada como referência
+def _meses_por_universidade(universidade: str, regras: Dict[str, int]) -> int:
+    if not universidade: return DEFAULT_DURATION_OTHERS
+    return regras.get(universidade.upper(), DEFAULT_DURATION_OTHERS)
+
+def _proxima_renovacao_linha(row: pd.Series, regras: Dict[str, int], hoje: date) -> str:
+    data_adm = row['data_admissao'].date() if pd.notna(row['data_admissao']) else None
+    data_ult_renov = row['data_ult_renovacao'].date() if pd.notna(row['data_ult_renovacao']) else None
+    if not data_adm: return ""
+    if _meses_por_universidade(row['universidade'], regras) >= 24: return "Contrato único"
+    limite_2_anos = data_adm + relativedelta(months=24)
+    if limite_2_anos < hoje: return "Contrato Encerrado"
+    base_date = data_ult_renov if data_ult_renov else data_adm
+    proxima_data_renovacao = base_date + relativedelta(months=6)
+    if proxima_data_renovacao > limite_2_anos: return "Término do Contrato"
+    if proxima_data_renovacao < hoje: return "Renovação Pendente"
+    return proxima_data_renovacao.strftime("%d.%m.%Y")
+
+def _status_linha(proxima_renovacao: str, data_vencimento, proximos_dias: int, hoje: date) -> str:
+    if proxima_renovacao == "Renovação Pendente": return "Vencido"
+    data_alvo = pd.to_datetime(proxima_renovacao, format='%d.%m.%Y', errors='coerce')
+    if pd.isna(data_alvo): data_alvo = data_vencimento
+    if pd.isna(data_alvo): return "SEM DATA"
+    delta = (data_alvo.date() - hoje).days
+    if delta < 0: return "Vencido"
+    if delta <= proximos_dias: return "Venc.Proximo"
+    return "OK"
+
+
+def _base_aleatoria(n: int, hoje: date, seed: int) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    # Inclui fins de mês (31, 29/02) para exercitar o limite do relativedelta
+    dias_especiais = [date(2024, 1, 31), date(2024, 2, 29), date(2023, 8, 31), date(2024, 12, 31)]
+    linhas = []
+    for _ in range(n):
+        adm = rnd.choice(dias_especiais) if rnd.random() < 0.1 else hoje - timedelta(days=rnd.randint(-60, 1200))
+        renov = adm + timedelta(days=rnd.randint(0, 800)) if rnd.random() < 0.5 else None
+        venc = rnd.choice([adm + relativedelta(months=24), None, hoje + timedelta(days=rnd.randint(-100, 100))])
+        linhas.append({
+            "universidade": rnd.choice(UNIVERSIDADES),
+            "data_admissao": None if rnd.random() < 0.03 else adm,
+            "data_ult_renovacao": renov,
+            "data_vencimento": venc,
+        })
+    df = pd.DataFrame(linhas)
+    for col in ["data_admissao", "data_ult_renovacao", "data_vencimento"]:
+        df[col] = pd.to_datetime(df[col])
+    return df
+
+@pytest.mark.parametrize("seed", range(5))
+def test_calcular_status_igual_ao_calculo_por_linha(seed):
+    rnd = random.Random(seed)
+    hoje = date(2025, 1, 1) + timedelta(days=rnd.randint(0, 730))
+    proximos_dias = rnd.choice([0, 15, 30, 90])
+    df = _base_aleatoria(4000, hoje, seed)
+
+    resultado = calcular_status(df, proximos_dias, REGRAS, hoje)
+
+    esperado_renov = df.apply(_proxima_renovacao_linha, axis=1, args=(REGRAS, hoje))
+    esperado_status = [_status_linha(p, v, proximos_dias, hoje) for p, v in zip(esperado_renov, df['data_vencimento'])]
+    esperado_ultimo_ano = ["SIM" if pd.notna(v) and v.year == hoje.year else "NÃO" for v in df['data_vencimento']]
+    assert resultado['proxima_renovacao'].tolist() == esperado_renov.tolist()
+    assert resultado['status'].tolist() == esperado_status
+    assert resultado['ultimo_ano'].tolist() == esperado_ultimo_ano